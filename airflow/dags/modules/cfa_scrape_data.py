@@ -9,9 +9,15 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
 import os
+import json
 import requests
 import snowflake.connector
+from PIL import Image
 from dotenv import load_dotenv
+from modules.metadata_writer import SnowflakeMetadataWriter
+
+# Cover thumbnails rendered at twice their display width for high-density screens
+THUMBNAIL_WIDTHS = {'small': 200, 'large': 400}
 
 def init_s3():
     load_dotenv()
@@ -70,14 +76,71 @@ def upload_to_s3(s3, bucket_name, file_path, s3_key):
     s3.upload_file(file_path, bucket_name, s3_key)
     return f"https://{bucket_name}.s3.amazonaws.com/{s3_key}"
 
-def save_metadata_to_snowflake(snowflake_conn, title, summary, image_s3_url, pdf_s3_url):
+def upload_thumbnails(s3, bucket_name, image_path, image_filename):
+    """Upload WebP thumbnails of a cover image and return their URLs by size."""
+    stem = os.path.splitext(image_filename)[0]
+    thumbnail_urls = {}
+    with Image.open(image_path) as image:
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size, width in THUMBNAIL_WIDTHS.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((width, width * 4))
+            thumbnail_path = f'{stem}_{width}.webp'
+            thumbnail.save(thumbnail_path, 'WEBP', quality=80, method=6)
+            try:
+                thumbnail_urls[size] = upload_to_s3(
+                    s3, bucket_name, thumbnail_path, f'images/thumbnails/{width}/{stem}.webp'
+                )
+            finally:
+                os.remove(thumbnail_path)
+    return thumbnail_urls
+
+def s3_key_exists(s3, bucket_name, s3_key):
+    try:
+        s3.head_object(Bucket=bucket_name, Key=s3_key)
+        return True
+    except Exception:
+        return False
+
+# Intermediate results are handed between DAG tasks as small JSON objects in S3
+def stage_record(s3, bucket_name, s3_key, record):
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=s3_key,
+        Body=json.dumps(record).encode('utf-8'),
+        ContentType='application/json',
+    )
+    return s3_key
+
+def load_staged_record(s3, bucket_name, s3_key):
+    response = s3.get_object(Bucket=bucket_name, Key=s3_key)
+    return json.loads(response['Body'].read())
+
+# Remove everything a DAG run staged once it is no longer needed
+def delete_staged_records(s3, bucket_name, prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{prefix}/"):
+        keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if keys:
+            s3.delete_objects(Bucket=bucket_name, Delete={'Objects': keys, 'Quiet': True})
+
+def save_metadata_to_snowflake(metadata_writer, title, summary, image_s3_url, pdf_s3_url, thumbnail_urls=None):
+    metadata_writer.add(title, summary, image_s3_url, pdf_s3_url, thumbnail_urls)
+
+# Add the columns the backend reads to tables created before they existed: the
+# thumbnails, and when each research note was saved so notes can be paged in order
+def ensure_metadata_columns(snowflake_conn):
     cursor = snowflake_conn.cursor()
-    query = """
-    INSERT INTO publications_metadata (title, summary, image_url, pdf_url)
-    VALUES (%s, %s, %s, %s)
-    """
-    cursor.execute(query, (title, summary, image_s3_url, pdf_s3_url))
-    cursor.close()
+    try:
+        cursor.execute("""
+        ALTER TABLE publications_metadata ADD COLUMN IF NOT EXISTS
+            thumbnail_small_url VARCHAR, thumbnail_large_url VARCHAR
+        """)
+        cursor.execute("""
+        ALTER TABLE research_notes ADD COLUMN IF NOT EXISTS created_at TIMESTAMP_NTZ
+        """)
+    finally:
+        cursor.close()
 
 def download_file(driver, file_url, save_path):
     # Get current cookies
@@ -102,7 +165,11 @@ def download_file(driver, file_url, save_path):
     else:
         print(f"Download failed, status code: {response.status_code}")
 
-def extract_publication(driver, publication, s3, bucket_name, snowflake_conn):
+def extract_publication_to_s3(driver, publication, s3, bucket_name):
+    """Upload the cover image and PDF of one publication to S3.
+
+    Returns the publication's metadata record, or None if it has no PDF.
+    """
     try:
         publication_url = publication['url']
         title = publication['title']
@@ -133,20 +200,28 @@ def extract_publication(driver, publication, s3, bucket_name, snowflake_conn):
             download_file(driver, image_url, image_filename)
             # Upload the image to S3
             image_s3_url = upload_to_s3(s3, bucket_name, image_filename, f'images/{image_filename}')
+            # Upload compact thumbnails next to the original
+            try:
+                thumbnail_urls = upload_thumbnails(s3, bucket_name, image_filename, image_filename)
+            except Exception as e:
+                print(f"Thumbnail generation failed: {e}")
+                thumbnail_urls = {}
             # Remove the local image file
             os.remove(image_filename)
         except Exception:
             image_s3_url = None  # Or set to empty string ''
+            thumbnail_urls = {}
 
         # Get the PDF link
         try:
             pdf_link_element = driver.find_element(By.CSS_SELECTOR, 'a[href*=".pdf"]')
             pdf_url = pdf_link_element.get_attribute('href')
             pdf_filename = os.path.basename(pdf_url).split('?')[0]
+            pdf_s3_key = f'pdfs/{pdf_filename}'
             # Download the PDF
             download_file(driver, pdf_url, pdf_filename)
             # Upload the PDF to S3
-            pdf_s3_url = upload_to_s3(s3, bucket_name, pdf_filename, f'pdfs/{pdf_filename}')
+            pdf_s3_url = upload_to_s3(s3, bucket_name, pdf_filename, pdf_s3_key)
             # Remove the local PDF file
             os.remove(pdf_filename)
         except Exception:
@@ -154,14 +229,12 @@ def extract_publication(driver, publication, s3, bucket_name, snowflake_conn):
             # Close the current tab and switch back
             driver.close()
             driver.switch_to.window(driver.window_handles[0])
-            return False
-
-        # Save metadata to Snowflake
-        save_metadata_to_snowflake(snowflake_conn, title, summary, image_s3_url, pdf_s3_url)
+            return None
 
         print(f"Title: {title}")
         print(f"Summary: {summary}")
         print(f"Image S3 URL: {image_s3_url}")
+        print(f"Thumbnail URLs: {thumbnail_urls}")
         print(f"PDF S3 URL: {pdf_s3_url}")
         print('------------------------')
 
@@ -169,34 +242,60 @@ def extract_publication(driver, publication, s3, bucket_name, snowflake_conn):
         driver.close()
         driver.switch_to.window(driver.window_handles[0])
 
-        return True
+        return {
+            'title': title,
+            'summary': summary,
+            'image_s3_url': image_s3_url,
+            'thumbnail_urls': thumbnail_urls,
+            'pdf_s3_url': pdf_s3_url,
+            'pdf_s3_key': pdf_s3_key,
+        }
     except Exception as e:
         print(f"Error processing publication: {e}")
         # Ensure the tab is closed and switch back
         if len(driver.window_handles) > 1:
             driver.close()
             driver.switch_to.window(driver.window_handles[0])
+        raise
+
+def extract_publication(driver, publication, s3, bucket_name, metadata_writer):
+    try:
+        record = extract_publication_to_s3(driver, publication, s3, bucket_name)
+    except Exception:
+        return False
+    if record is None:
         return False
 
-def extract_publications(driver, s3, bucket_name, snowflake_conn):
+    # Save metadata to Snowflake
+    save_metadata_to_snowflake(
+        metadata_writer, record['title'], record['summary'], record['image_s3_url'], record['pdf_s3_url'],
+        record['thumbnail_urls'],
+    )
+    return True
+
+def collect_publications(driver):
+    # Wait for all publication elements to load
+    pub_elements = WebDriverWait(driver, 10).until(
+        EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'h4.coveo-title a.CoveoResultLink'))
+    )
+    # Collect all publication URLs and titles
+    publications = []
+    for pub_element in pub_elements:
+        publication_url = pub_element.get_attribute('href')
+        title = pub_element.text
+        publications.append({'url': publication_url, 'title': title})
+    return publications
+
+def extract_publications(driver, s3, bucket_name, metadata_writer):
     try:
-        # Wait for all publication elements to load
-        pub_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'h4.coveo-title a.CoveoResultLink'))
-        )
-        # Collect all publication URLs and titles
-        publications = []
-        for pub_element in pub_elements:
-            publication_url = pub_element.get_attribute('href')
-            title = pub_element.text
-            publications.append({'url': publication_url, 'title': title})
+        publications = collect_publications(driver)
 
         # Process each publication one by one
         for i, publication in enumerate(publications):
             print(f"Processing publication {i+1} on current page...")
-            if not extract_publication(driver, publication, s3, bucket_name, snowflake_conn):
+            if not extract_publication(driver, publication, s3, bucket_name, metadata_writer):
                 print(f"Failed to process publication {i+1}, retrying...")
-                if not extract_publication(driver, publication, s3, bucket_name, snowflake_conn):  # Retry
+                if not extract_publication(driver, publication, s3, bucket_name, metadata_writer):  # Retry
                     print(f"Still failed to process publication {i+1} after retry.")
         return True
     except Exception as e:
@@ -216,34 +315,33 @@ def close_popups(driver):
     except Exception:
         pass  # Ignore if no overlay is found
 
-def navigate_and_extract_all_publications(driver, s3, bucket_name, snowflake_conn, total_pages):
+def go_to_next_page(driver, page):
+    try:
+        # Ensure no overlay elements are present
+        close_popups(driver)
+
+        # Click the "Next" button
+        next_button = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, '[aria-label="Next"]'))
+        )
+        driver.execute_script("arguments[0].scrollIntoView();", next_button)
+        next_button.click()
+        time.sleep(5)  # Wait for the new page to load
+        return True
+    except Exception as e:
+        print(f"Error navigating to page {page+1}: {e}")
+        return False
+
+def navigate_and_extract_all_publications(driver, s3, bucket_name, metadata_writer, total_pages):
     for page in range(1, total_pages + 1):
         print(f"Extracting page {page}...")
-        if not extract_publications(driver, s3, bucket_name, snowflake_conn):
+        if not extract_publications(driver, s3, bucket_name, metadata_writer):
             break
 
-        if page < total_pages:
-            try:
-                # Ensure no overlay elements are present
-                close_popups(driver)
-
-                # Click the "Next" button
-                next_button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, '[aria-label="Next"]'))
-                )
-                driver.execute_script("arguments[0].scrollIntoView();", next_button)
-                next_button.click()
-                time.sleep(5)  # Wait for the new page to load
-            except Exception as e:
-                print(f"Error navigating to page {page+1}: {e}")
-                break
-
-def scrape_data():
-    # Initialize resources
-    s3, bucket_name = init_s3()
-    snowflake_conn = init_snowflake()
-    driver = init_driver()
+        if page < total_pages and not go_to_next_page(driver, page):
+            break
 
+def open_publications_page(driver):
     # Target URL
     url = 'https://rpc.cfainstitute.org/en/research-foundation/publications'
 
@@ -272,13 +370,60 @@ def scrape_data():
     except Exception as e:
         print(f"Error setting filters: {e}")
 
+def list_publications(driver, total_pages):
+    publications = []
+    for page in range(1, total_pages + 1):
+        print(f"Listing page {page}...")
+        try:
+            publications.extend(collect_publications(driver))
+        except Exception as e:
+            print(f"Error listing publications: {e}")
+            break
+
+        if page < total_pages and not go_to_next_page(driver, page):
+            break
+    print(f"Found {len(publications)} publications.")
+    return publications
+
+# Ask the backend to embed the given PDFs, recording which ones were indexed so
+# that later runs only ingest new documents
+def index_new_pdfs(s3, bucket_name, pdf_s3_keys, batch_size=5):
+    backend_url = os.getenv('BACKEND_URL', 'http://backend:8000')
+    pending = [
+        key for key in dict.fromkeys(pdf_s3_keys)
+        if not s3_key_exists(s3, bucket_name, f'index_markers/{key}')
+    ]
+    print(f"{len(pending)} of {len(set(pdf_s3_keys))} PDFs need to be indexed.")
+
+    indexed = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        response = requests.post(f"{backend_url}/index_pdfs", json={"s3_keys": batch}, timeout=1800)
+        response.raise_for_status()
+        for key in response.json().get("indexed", []):
+            s3.put_object(Bucket=bucket_name, Key=f'index_markers/{key}', Body=b'')
+            indexed.append(key)
+    return indexed
+
+def scrape_data():
+    # Initialize resources
+    s3, bucket_name = init_s3()
+    snowflake_conn = init_snowflake()
+    driver = init_driver()
+
+    open_publications_page(driver)
+
     # Start extracting all publications
     total_pages = 10
-    navigate_and_extract_all_publications(driver, s3, bucket_name, snowflake_conn, total_pages)
-
-    # Close the browser and connections
-    driver.quit()
-    snowflake_conn.close()
+    try:
+        ensure_metadata_columns(snowflake_conn)
+        # Metadata is buffered and loaded in batches inside one transaction
+        with SnowflakeMetadataWriter(snowflake_conn) as metadata_writer:
+            navigate_and_extract_all_publications(driver, s3, bucket_name, metadata_writer, total_pages)
+    finally:
+        # Close the browser and connections
+        driver.quit()
+        snowflake_conn.close()
 
 if __name__ == "__main__":
     scrape_data()
@@ -0,0 +1,75 @@
+# modules/metadata_writer.py
+
+import os
+
+class SnowflakeMetadataWriter:
+    """Buffer publication metadata and write it to Snowflake in batches.
+
+    Rows are inserted with ``executemany`` once ``flush_threshold`` rows are
+    buffered, and every batch of a run shares a single transaction that is
+    committed by ``close()``. Any DB-API connection works, so a local fake
+    connection can stand in for Snowflake.
+    """
+
+    INSERT_QUERY = """
+    INSERT INTO publications_metadata (title, summary, image_url, pdf_url, thumbnail_small_url, thumbnail_large_url)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, snowflake_conn, flush_threshold=None):
+        self.conn = snowflake_conn
+        self.flush_threshold = flush_threshold or int(os.getenv('METADATA_FLUSH_THRESHOLD', '50'))
+        self.rows = []
+        self.rows_written = 0
+        self.batches_written = 0
+        self.in_transaction = False
+
+    def add(self, title, summary, image_s3_url, pdf_s3_url, thumbnail_urls=None):
+        thumbnail_urls = thumbnail_urls or {}
+        self.rows.append((
+            title, summary, image_s3_url, pdf_s3_url, thumbnail_urls.get('small'), thumbnail_urls.get('large')
+        ))
+        if len(self.rows) >= self.flush_threshold:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        cursor = self.conn.cursor()
+        try:
+            if not self.in_transaction:
+                cursor.execute("BEGIN")
+                self.in_transaction = True
+            cursor.executemany(self.INSERT_QUERY, self.rows)
+        finally:
+            cursor.close()
+        self.rows_written += len(self.rows)
+        self.batches_written += 1
+        self.rows = []
+
+    def close(self):
+        # Flush the remaining rows and commit everything written during the run
+        try:
+            self.flush()
+            if self.in_transaction:
+                self.conn.commit()
+                self.in_transaction = False
+            print(f"Saved {self.rows_written} publications to Snowflake in {self.batches_written} batch(es).")
+        except Exception:
+            self.rollback()
+            raise
+
+    def rollback(self):
+        self.rows = []
+        if self.in_transaction:
+            self.conn.rollback()
+            self.in_transaction = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.rollback()
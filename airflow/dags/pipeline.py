@@ -1,9 +1,24 @@
 # airflow/dags/pipeline.py
 
 from airflow import DAG
-from airflow.operators.python import PythonOperator
+from airflow.decorators import task
+from airflow.exceptions import AirflowSkipException
+from airflow.operators.python import get_current_context
 from datetime import datetime, timedelta
-from modules.cfa_scrape_data import scrape_data
+from modules.cfa_scrape_data import (
+    init_s3,
+    init_snowflake,
+    init_driver,
+    open_publications_page,
+    list_publications,
+    extract_publication_to_s3,
+    stage_record,
+    load_staged_record,
+    delete_staged_records,
+    index_new_pdfs,
+    ensure_metadata_columns,
+    SnowflakeMetadataWriter,
+)
 
 default_args = {
     'owner': 'airflow',
@@ -11,7 +26,7 @@ default_args = {
     'email': ['your_email@example.com'],  # Replace with your email
     'email_on_failure': False,
     'email_on_retry': False,
-    'retries': 0,
+    'retries': 1,
     'retry_delay': timedelta(minutes=5),
 }
 
@@ -24,11 +39,75 @@ dag = DAG(
     catchup=False,
 )
 
+TOTAL_PAGES = 10
 
-scrape_task = PythonOperator(
-    task_id='scrape_data',
-    python_callable=scrape_data,
-    dag=dag,
-)
 
-scrape_task  # Only one task in this DAG
+def staging_prefix():
+    context = get_current_context()
+    return f"staging/{context['dag'].dag_id}/{context['run_id']}"
+
+
+with dag:
+
+    # Stage 1: collect the URL and title of every publication in the listing
+    @task
+    def list_publications_task():
+        driver = init_driver()
+        try:
+            open_publications_page(driver)
+            return list_publications(driver, TOTAL_PAGES)
+        finally:
+            driver.quit()
+
+    # Stage 2: one mapped task per publication uploads its files to S3 and
+    # stages the metadata record, returning only the record's S3 key
+    @task(retries=3, retry_delay=timedelta(minutes=1), max_active_tis_per_dag=4)
+    def extract_publication_task(publication):
+        s3, bucket_name = init_s3()
+        driver = init_driver()
+        try:
+            record = extract_publication_to_s3(driver, publication, s3, bucket_name)
+        finally:
+            driver.quit()
+        if record is None:
+            raise AirflowSkipException(f"No PDF found for {publication['title']}")
+
+        context = get_current_context()
+        record_key = f"{staging_prefix()}/records/{context['ti'].map_index}.json"
+        return stage_record(s3, bucket_name, record_key, record)
+
+    # Stage 3: bulk-load every staged record into Snowflake in one transaction
+    @task(trigger_rule='all_done')
+    def load_metadata_task(record_keys):
+        record_keys = [key for key in record_keys if key]
+        s3, bucket_name = init_s3()
+        snowflake_conn = init_snowflake()
+        pdf_s3_keys = []
+        try:
+            ensure_metadata_columns(snowflake_conn)
+            with SnowflakeMetadataWriter(snowflake_conn) as metadata_writer:
+                for record_key in record_keys:
+                    record = load_staged_record(s3, bucket_name, record_key)
+                    metadata_writer.add(
+                        record['title'], record['summary'], record['image_s3_url'], record['pdf_s3_url'],
+                        record.get('thumbnail_urls'),
+                    )
+                    pdf_s3_keys.append(record['pdf_s3_key'])
+        finally:
+            snowflake_conn.close()
+        return stage_record(s3, bucket_name, f"{staging_prefix()}/pdf_keys.json", pdf_s3_keys)
+
+    # Stage 4: embed only the PDFs that have not been indexed before, then drop the run's
+    # staged records; a failed run keeps them so its tasks can be cleared and re-run
+    @task
+    def index_pdfs_task(pdf_keys_key):
+        s3, bucket_name = init_s3()
+        pdf_s3_keys = load_staged_record(s3, bucket_name, pdf_keys_key)
+        indexed = index_new_pdfs(s3, bucket_name, pdf_s3_keys)
+        print(f"Indexed {len(indexed)} new PDFs.")
+        delete_staged_records(s3, bucket_name, staging_prefix())
+
+    publications = list_publications_task()
+    record_keys = extract_publication_task.expand(publication=publications)
+    pdf_keys_key = load_metadata_task(record_keys)
+    index_pdfs_task(pdf_keys_key)
@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted or misses its deadline."""
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """Bounded, prioritised work queue in front of a slow upstream such as the LLM.
+
+    At most ``max_concurrency`` calls run at once and at most ``max_queue``
+    wait. A full queue rejects the newcomer straight away, unless a waiting
+    request has a lower priority, in which case that one is rejected instead.
+    Each call carries a deadline covering both its queue wait and its run time.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, default_deadline: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.default_deadline = default_deadline
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._service_time = 1.0
+
+    def retry_after(self) -> int:
+        # Rough time until a slot frees up, from the smoothed service time
+        backlog = (len(self._queue) + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        return Overloaded(reason, self.retry_after())
+
+    async def _acquire(self, priority: int, deadline_at: float):
+        if self.active < self.max_concurrency and not self._queue:
+            self.active += 1
+            return
+
+        if len(self._queue) >= self.max_queue:
+            # Waiters that already gave up do not hold a place
+            self._queue = [entry for entry in self._queue if not entry[2].done()]
+            heapq.heapify(self._queue)
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue)
+            if worst[0] <= priority:
+                raise self._reject("Too many requests are queued.")
+            # Make room by rejecting the lowest-priority, most recent waiter
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            worst[2].set_exception(self._reject("Displaced by a higher-priority request."))
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (priority, next(self._sequence), waiter)
+        heapq.heappush(self._queue, entry)
+        try:
+            await asyncio.wait_for(waiter, max(deadline_at - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self.timed_out += 1
+            raise Overloaded("Deadline exceeded while queued.", self.retry_after())
+        except asyncio.CancelledError:
+            # The caller went away, e.g. the client disconnected
+            self._abandon(entry)
+            raise
+
+    def _abandon(self, entry):
+        waiter = entry[2]
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        elif waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+            # The slot was granted just as the waiter gave up; hand it on
+            self._release()
+
+    def _release(self):
+        self.active -= 1
+        while self._queue and self.active < self.max_concurrency:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def _finished(self, task: asyncio.Task, started: float):
+        if not task.cancelled():
+            task.exception()  # Mark the error as retrieved when the caller already gave up
+        self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+        self._release()
+
+    async def run(self, fn: Callable[[], Any], priority: int = INTERACTIVE, deadline: Optional[float] = None) -> Any:
+        """Run the blocking ``fn`` in a worker thread once admitted."""
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self.default_deadline)
+        await self._acquire(priority, deadline_at)
+        self.admitted += 1
+
+        # The slot stays held until the thread finishes, even if the caller gives up
+        started = time.monotonic()
+        task = asyncio.ensure_future(run_in_threadpool(fn))
+        task.add_done_callback(lambda done: self._finished(done, started))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), max(deadline_at - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded("Deadline exceeded while processing.", self.retry_after(), status_code=504)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._queue),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -0,0 +1,140 @@
+"""Tail latency of LLM calls under overload, with and without admission control.
+
+A fake LLM slows down as its concurrency rises past its capacity, like a
+throttled upstream. Requests arrive open-loop faster than it can serve them;
+the run without admission control lets every request through, while the
+controlled run queues, prioritises and rejects. Afterwards it checks that the
+controlled interactive p99 stays within the deadline and below the
+uncontrolled one; a failed check exits non-zero.
+
+    python -m backend.benchmarks.bench_admission --rate 40 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import anyio.to_thread
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from backend.admission import AdmissionController, Overloaded, INTERACTIVE, BACKGROUND
+
+
+class FakeSlowLLM:
+    def __init__(self, base_latency: float, capacity: int):
+        self.base_latency = base_latency
+        self.capacity = capacity
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def complete(self):
+        with self._lock:
+            self.active += 1
+            slowdown = max(1.0, self.active / self.capacity)
+        time.sleep(self.base_latency * slowdown)
+        with self._lock:
+            self.active -= 1
+        return "answer"
+
+
+def summarize(latencies, rejected):
+    if not latencies:
+        return {"served": 0, "rejected": rejected}
+    return {
+        "served": len(latencies),
+        "rejected": rejected,
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "p99_s": float(np.percentile(latencies, 99)),
+        "max_s": float(max(latencies)),
+    }
+
+
+async def drive(call, rate, duration, background_share, seed=0):
+    rng = random.Random(seed)
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    rejected = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    async def one(priority):
+        start = time.monotonic()
+        try:
+            await call(priority)
+            latencies[priority].append(time.monotonic() - start)
+        except Overloaded:
+            rejected[priority] += 1
+
+    tasks = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        priority = BACKGROUND if rng.random() < background_share else INTERACTIVE
+        tasks.append(asyncio.ensure_future(one(priority)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return {
+        "interactive": summarize(latencies[INTERACTIVE], rejected[INTERACTIVE]),
+        "background": summarize(latencies[BACKGROUND], rejected[BACKGROUND]),
+    }
+
+
+def check_results(results, deadline, margin):
+    controlled = results["admission_control"]["interactive"]
+    unbounded = results["unbounded"]["interactive"]
+    assert controlled["served"] and unbounded["served"], "no interactive request was served"
+    # Queue wait and run time both count against the deadline
+    assert controlled["p99_s"] <= deadline + margin, (
+        f"controlled interactive p99 {controlled['p99_s']:.3f}s exceeds the {deadline}s deadline"
+    )
+    assert unbounded["p99_s"] > controlled["p99_s"], (
+        f"admission control did not lower the interactive p99 "
+        f"({controlled['p99_s']:.3f}s controlled, {unbounded['p99_s']:.3f}s unbounded)"
+    )
+    return {"deadline_s": deadline, "margin_s": margin}
+
+
+async def run(args):
+    # Give the unbounded run enough threads that the pool is not the limiter
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 1000
+
+    llm = FakeSlowLLM(args.latency, args.capacity)
+    unbounded = await drive(lambda priority: run_in_threadpool(llm.complete), args.rate, args.duration, args.background_share)
+
+    llm = FakeSlowLLM(args.latency, args.capacity)
+    controller = AdmissionController(args.capacity, args.queue, args.deadline)
+    controlled = await drive(
+        lambda priority: controller.run(llm.complete, priority=priority),
+        args.rate, args.duration, args.background_share,
+    )
+    results = {
+        "config": vars(args),
+        "unbounded": unbounded,
+        "admission_control": {**controlled, "controller": controller.stats()},
+    }
+    results["checks"] = check_results(results, args.deadline, args.margin)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=40.0, help="Arrivals per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of arrivals")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency at or below capacity")
+    parser.add_argument("--capacity", type=int, default=4, help="Fake LLM concurrency before it slows down")
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--background-share", type=float, default=0.2)
+    parser.add_argument("--margin", type=float, default=0.25, help="Seconds the controlled p99 may exceed the deadline by")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Latency and throughput of the FastAPI endpoints under concurrent load, fully offline.
+
+The real app from backend.main runs in-process behind httpx's ASGI transport.
+Snowflake is replaced by a seeded in-memory fake, the NVIDIA embedder and LLM
+by fakes with configurable latency, and Pinecone by a LocalVectorStore in a
+temporary directory. Each scenario is closed-loop: ``--concurrency`` clients
+send requests back to back until ``--requests`` have completed.
+
+    python -m backend.benchmarks.bench_api --concurrency 16 --requests 200 --llm-latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+from backend.benchmarks.fakes import (
+    FakeEmbedding, FakeLLM, FakeSnowflake, WORDS, install_backend_fakes, wait_until_ready,
+)
+
+
+def summarize(latencies, statuses, elapsed):
+    result = {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "status_codes": dict(Counter(statuses)),
+    }
+    if latencies:
+        result.update({
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            "max_ms": float(max(latencies) * 1000),
+        })
+    return result
+
+
+async def drive(client, make_request, concurrency, total):
+    latencies, statuses = [], []
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def scenarios(titles, seed=0):
+    rng = random.Random(seed)
+    # A handful of popular questions, as when many users open the same document
+    popular = [" ".join(rng.choice(WORDS) for _ in range(6)) + "?" for _ in range(5)]
+
+    def question(i):
+        return " ".join(random.Random(i).choice(WORDS) for _ in range(6)) + "?"
+
+    return {
+        "documents": lambda i: ("GET", "/documents", {}),
+        "document_page": lambda i: ("GET", f"/documents/{titles[i % len(titles)]}/page", {}),
+        "search_full_text": lambda i: (
+            "GET", f"/search_full_text/{titles[i % len(titles)]}", {"params": {"query": question(i)}}
+        ),
+        "ask_unique": lambda i: (
+            "POST", "/ask", {"json": {"title": titles[i % len(titles)], "question": question(i)}}
+        ),
+        "ask_repeated": lambda i: (
+            "POST", "/ask", {"json": {"title": titles[0], "question": popular[i % len(popular)]}}
+        ),
+    }
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as store_dir:
+        os.environ.update({
+            "VECTOR_STORE_BACKEND": "local",
+            "LOCAL_VECTOR_STORE_DIR": store_dir,
+            "EMBEDDING_CACHE_ENABLED": "false",
+            "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+            "LLM_MAX_QUEUE": str(args.llm_queue),
+        })
+        # Imported late so that the admission limits above are picked up
+        from backend import main
+        from backend.metrics import registry
+
+        fake_snowflake = FakeSnowflake(args.snowflake_connect_latency, args.snowflake_query_latency)
+        titles = fake_snowflake.seed(args.publications, args.notes_per_publication)
+        llm = FakeLLM(latency=args.llm_latency, output_tokens=args.output_tokens)
+        install_backend_fakes(main, fake_snowflake, FakeEmbedding(latency=args.embed_latency), llm)
+
+        results = {"config": vars(args), "scenarios": {}}
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                results["startup_seconds"] = await wait_until_ready(client)
+                for name, make_request in scenarios(titles).items():
+                    if args.scenario and name not in args.scenario:
+                        continue
+                    llm_calls = llm.calls
+                    results["scenarios"][name] = await drive(client, make_request, args.concurrency, args.requests)
+                    results["scenarios"][name]["llm_calls"] = llm.calls - llm_calls
+
+            results["stages"] = registry.summary("rag_stage_duration_seconds")
+            results["admission"] = main.llm_admission.stats()
+            results["coalescing"] = {"ask": main.ask_flight.stats(), "search_full_text": main.search_flight.stats()}
+            results["snowflake"] = {"connections": fake_snowflake.connections, "queries": fake_snowflake.queries}
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--scenario", nargs="*", help="Only run these scenarios")
+    parser.add_argument("--publications", type=int, default=50)
+    parser.add_argument("--notes-per-publication", type=int, default=4)
+    parser.add_argument("--snowflake-connect-latency", type=float, default=0.05)
+    parser.add_argument("--snowflake-query-latency", type=float, default=0.01)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--llm-queue", type=int, default=32)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
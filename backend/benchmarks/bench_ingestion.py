@@ -0,0 +1,118 @@
+"""Ingestion throughput of the PDF pipeline against fake S3 and a fake embedder.
+
+Generated PDFs are uploaded to moto's in-process S3, then pass through the
+same steps as insert_vector.py: list_pdf_keys, get_pdf_documents, chunking,
+then embedding and indexing into a LocalVectorStore. The run is then
+repeated with a warm embedding cache, as when the DAG re-indexes.
+
+    python -m backend.benchmarks.bench_ingestion --pdfs 50 --pages 8 --embed-latency 0.05
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+import boto3
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+
+from backend.benchmarks.fakes import FakeEmbedding, make_pdf, mock_s3, synthetic_text
+from backend.document_processors import get_pdf_documents, list_pdf_keys
+from backend.embedding_cache import CachedEmbedding, EmbeddingStore
+from backend.vector_stores import LocalVectorStore
+
+BUCKET = "bench-bucket"
+
+
+def upload_pdfs(s3, num_pdfs, pages, seed=0):
+    rng = random.Random(seed)
+    total_bytes = 0
+    for i in range(num_pdfs):
+        body = make_pdf([synthetic_text(rng, 25) for _ in range(pages)])
+        s3.put_object(Bucket=BUCKET, Key=f"pdfs/publication-{i:04d}.pdf", Body=body)
+        total_bytes += len(body)
+    return total_bytes
+
+
+def ingest(s3, embed_model, store_dir, chunk_size):
+    timings = {}
+    start = time.perf_counter()
+    keys = list_pdf_keys(s3, BUCKET)
+    timings["list_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    documents = get_pdf_documents(keys, s3, BUCKET)
+    timings["extract_seconds"] = time.perf_counter() - start
+
+    # Same steps as insert_vector.create_llama_index, with chunking timed on its own
+    Settings.embed_model = embed_model
+    Settings.text_splitter = SentenceSplitter(chunk_size=chunk_size)
+    start = time.perf_counter()
+    nodes = Settings.text_splitter.get_nodes_from_documents(documents)
+    timings["chunk_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    storage_context = StorageContext.from_defaults(vector_store=LocalVectorStore(persist_dir=store_dir))
+    VectorStoreIndex(nodes, storage_context=storage_context)
+    timings["embed_and_insert_seconds"] = time.perf_counter() - start
+
+    total = sum(timings.values())
+    return {
+        "documents": len(documents),
+        "chunks": len(nodes),
+        **timings,
+        "total_seconds": total,
+        "documents_per_second": len(documents) / total if total else 0.0,
+        "chunks_per_second": len(nodes) / total if total else 0.0,
+    }
+
+
+def run(args):
+    mock = mock_s3()
+    try:
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        total_bytes = upload_pdfs(s3, args.pdfs, args.pages)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            fake = FakeEmbedding(latency=args.embed_latency, embed_batch_size=args.embed_batch_size)
+            cached = CachedEmbedding(fake, EmbeddingStore(f"{work_dir}/cache"))
+
+            cold = ingest(s3, cached, f"{work_dir}/cold", args.chunk_size)
+            cold["embedding_calls"] = fake.calls
+
+            calls_before = fake.calls
+            warm = ingest(s3, cached, f"{work_dir}/warm", args.chunk_size)
+            warm["embedding_calls"] = fake.calls - calls_before
+            warm["embedding_cache"] = cached.stats()
+    finally:
+        mock.stop()
+
+    return {
+        "config": vars(args),
+        "pdf_megabytes": total_bytes / 1e6,
+        "cold_cache": cold,
+        "warm_cache": warm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Seconds per embedding request")
+    parser.add_argument("--embed-batch-size", type=int, default=10)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Scraped-metadata load into Snowflake: one insert per row against the batched writer.
+
+Drives the Airflow DAG's SnowflakeMetadataWriter through the fake Snowflake
+connection. Before timing, it checks that batches are flushed at the
+threshold, that one commit covers the whole run and that an error rolls
+every batch back; a failed check exits non-zero.
+
+    python -m backend.benchmarks.bench_metadata_writer --rows 500 --query-latency 0.02
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from backend.benchmarks.fakes import FakeSnowflake, synthetic_text
+
+# The DAG modules are imported the way Airflow does, with airflow/dags on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "airflow", "dags"))
+from modules.metadata_writer import SnowflakeMetadataWriter  # noqa: E402
+
+COUNT_QUERY = "SELECT COUNT(*) FROM PUBLICATIONS_METADATA;"
+
+
+def metadata_rows(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        (f"Scraped {i:05d}", synthetic_text(rng, 3), f"https://bucket/images/{i}.jpg", f"https://bucket/pdfs/{i}.pdf")
+        for i in range(count)
+    ]
+
+
+def stored_rows(fake):
+    return fake._execute(COUNT_QUERY)[0][0]
+
+
+def check_writer(threshold=10):
+    fake = FakeSnowflake()
+    rows = metadata_rows(threshold * 2 + 5)
+
+    # Batches go out as the threshold is reached, and nothing is committed before close()
+    writer = SnowflakeMetadataWriter(fake.connect(), flush_threshold=threshold)
+    for row in rows:
+        writer.add(*row)
+    assert writer.batches_written == 2, f"expected 2 batches before close, got {writer.batches_written}"
+    assert len(writer.rows) == 5, f"expected 5 buffered rows, got {len(writer.rows)}"
+    assert fake.commits == 0, "rows were committed before close()"
+    writer.close()
+    assert writer.batches_written == 3 and writer.rows_written == len(rows)
+    assert fake.commits == 1, f"expected one commit for the run, got {fake.commits}"
+    assert stored_rows(fake) == len(rows)
+
+    # An error inside the run rolls back the batches already sent
+    try:
+        with SnowflakeMetadataWriter(fake.connect(), flush_threshold=threshold) as writer:
+            for row in metadata_rows(threshold + 3, seed=1):
+                writer.add(*row)
+            raise RuntimeError("scrape failed")
+    except RuntimeError:
+        pass
+    assert fake.rollbacks == 1, f"expected one rollback, got {fake.rollbacks}"
+    assert stored_rows(fake) == len(rows), "rolled-back rows are still stored"
+    return {"batches": 3, "commits": fake.commits, "rollbacks": fake.rollbacks}
+
+
+def per_row(fake, rows):
+    # The load before batching: one INSERT and one commit per publication
+    conn = fake.connect()
+    for row in rows:
+        cursor = conn.cursor()
+        cursor.execute(SnowflakeMetadataWriter.INSERT_QUERY, (*row, None, None))
+        conn.commit()
+        cursor.close()
+
+
+def batched(fake, rows, threshold):
+    with SnowflakeMetadataWriter(fake.connect(), flush_threshold=threshold) as writer:
+        for row in rows:
+            writer.add(*row)
+
+
+def timed(load, rows, query_latency, *args):
+    fake = FakeSnowflake(query_latency=query_latency)
+    start = time.perf_counter()
+    load(fake, rows, *args)
+    seconds = time.perf_counter() - start
+    return {
+        "total_seconds": seconds,
+        "rows_per_second": len(rows) / seconds,
+        "snowflake": {"queries": fake.queries, "commits": fake.commits},
+    }
+
+
+def run(args):
+    results = {"config": vars(args), "checks": check_writer()}
+    rows = metadata_rows(args.rows)
+    results["per_row"] = timed(per_row, rows, args.query_latency)
+    results["batched"] = timed(batched, rows, args.query_latency, args.flush_threshold)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500, help="Publications to load")
+    parser.add_argument("--flush-threshold", type=int, default=50)
+    parser.add_argument("--query-latency", type=float, default=0.02, help="Seconds per Snowflake round trip")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Import time of backend.main and time until the app is healthy, serving and ready.
+
+The import is timed in fresh interpreters. Startup runs the real lifespan
+against the offline fakes and polls /health, /documents and /ready
+until each first answers 200, once rebuilding the index from the seeded
+notes and once attaching to the store that run left on disk
+(INDEX_STARTUP_MODE=attach).
+
+    python -m backend.benchmarks.bench_startup --notes 2000 --embed-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from backend.benchmarks.fakes import FakeEmbedding, FakeLLM, FakeSnowflake, install_backend_fakes
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+elapsed = time.perf_counter() - start
+heavy = ["llama_index.core", "llama_index.llms.nvidia", "pinecone", "snowflake.connector"]
+print(json.dumps({"seconds": elapsed, "heavy_modules_loaded": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def measure_import(repeats):
+    runs = []
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        "median_seconds": statistics.median(run["seconds"] for run in runs),
+        "runs_seconds": [run["seconds"] for run in runs],
+        "heavy_modules_loaded": runs[0]["heavy_modules_loaded"],
+    }
+
+
+async def first_ok(client, path, start, timeout, interval=0.005):
+    while time.perf_counter() - start < timeout:
+        if (await client.get(path)).status_code == 200:
+            return time.perf_counter() - start
+        await asyncio.sleep(interval)
+    return None
+
+
+async def measure_startup(main, mode, timeout):
+    os.environ["INDEX_STARTUP_MODE"] = mode
+    start = time.perf_counter()
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            ask_before_ready = (await client.post("/ask", json={"title": "Publication 0000", "question": "yield?"}))
+            health, documents, ready = await asyncio.gather(
+                first_ok(client, "/health", start, timeout),
+                first_ok(client, "/documents", start, timeout),
+                first_ok(client, "/ready", start, timeout),
+            )
+    return {
+        "health_seconds": health,
+        "documents_seconds": documents,
+        "ready_seconds": ready,
+        "ask_status_before_ready": ask_before_ready.status_code,
+    }
+
+
+async def run(args):
+    results = {"config": vars(args), "import": measure_import(args.import_repeats)}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        os.environ.update({
+            "VECTOR_STORE_BACKEND": "local",
+            "LOCAL_VECTOR_STORE_DIR": store_dir,
+            "EMBEDDING_CACHE_ENABLED": "false",
+        })
+        from backend import main
+
+        fake_snowflake = FakeSnowflake(args.snowflake_connect_latency)
+        fake_snowflake.seed(max(args.notes // 4, 1), 4)
+        install_backend_fakes(main, fake_snowflake, FakeEmbedding(latency=args.embed_latency), FakeLLM())
+
+        results["rebuild"] = await measure_startup(main, "rebuild", args.timeout)
+        results["attach"] = await measure_startup(main, "attach", args.timeout)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000, help="Research notes indexed at startup")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--snowflake-connect-latency", type=float, default=0.05)
+    parser.add_argument("--import-repeats", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Recall and latency of LocalVectorStore against exact brute-force search.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_vector_store --vectors 50000 --nprobe 4 8 16
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from backend.vector_stores import LocalVectorStore
+
+
+def make_dataset(num_vectors, dimension, num_queries, num_clusters=64, seed=0):
+    # Clustered vectors resemble chunk embeddings better than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dimension))
+    labels = rng.integers(num_clusters, size=num_vectors + num_queries)
+    data = centers[labels] + 0.5 * rng.normal(size=(len(labels), dimension))
+    data = (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+    return data[:num_vectors], data[num_vectors:]
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def run(num_vectors, dimension, num_queries, top_k, nprobes):
+    vectors, queries = make_dataset(num_vectors, dimension, num_queries)
+    exact_ids = []
+    exact_latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        exact_ids.append({f"n{i}" for i in top})
+        exact_latencies.append(time.perf_counter() - start)
+
+    results = {
+        "vectors": num_vectors,
+        "dimension": dimension,
+        "queries": num_queries,
+        "top_k": top_k,
+        "exact": {
+            "p50_ms": percentile_ms(exact_latencies, 50),
+            "p95_ms": percentile_ms(exact_latencies, 95),
+        },
+        "local": [],
+    }
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        store = LocalVectorStore(persist_dir=persist_dir)
+        start = time.perf_counter()
+        batch_size = 2048
+        for offset in range(0, num_vectors, batch_size):
+            store.add([
+                TextNode(id_=f"n{i}", text="", metadata={"title": f"doc-{i % 50}"}, embedding=vectors[i].tolist())
+                for i in range(offset, min(offset + batch_size, num_vectors))
+            ])
+        results["build_seconds"] = time.perf_counter() - start
+
+        for nprobe in nprobes:
+            store.nprobe = nprobe
+            latencies = []
+            hits = 0
+            for q, expected in zip(queries, exact_ids):
+                start = time.perf_counter()
+                result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k))
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & set(result.ids))
+            results["local"].append({
+                "nprobe": nprobe,
+                f"recall_at_{top_k}": hits / (top_k * num_queries),
+                "p50_ms": percentile_ms(latencies, 50),
+                "p95_ms": percentile_ms(latencies, 95),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args.vectors, args.dimension, args.queries, args.top_k, args.nprobe)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Deterministic local stand-ins for Snowflake, NVIDIA and S3, used by the benchmarks.
+
+Each fake can add a fixed latency so that runs resemble the real services
+without needing credentials or a network. Results depend only on the seed.
+"""
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, List, Optional, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.base.llms.types import CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.llms.custom import CustomLLM
+
+WORDS = (
+    "asset allocation equity bond yield duration credit spread inflation risk return portfolio "
+    "factor momentum value growth volatility liquidity hedge currency emerging market pension "
+    "fund manager benchmark alpha beta correlation drawdown leverage derivative option swap "
+    "valuation earnings dividend capital structure governance sustainability climate regulation"
+).split()
+
+TABLES = """
+CREATE TABLE PUBLICATIONS_METADATA (
+    TITLE TEXT, SUMMARY TEXT, IMAGE_URL TEXT, PDF_URL TEXT,
+    THUMBNAIL_SMALL_URL TEXT, THUMBNAIL_LARGE_URL TEXT
+);
+CREATE TABLE RESEARCH_NOTES (TITLE TEXT, NOTE_TEXT TEXT, CREATED_AT TEXT);
+CREATE INDEX PUBLICATIONS_TITLE ON PUBLICATIONS_METADATA (TITLE);
+CREATE INDEX NOTES_TITLE ON RESEARCH_NOTES (TITLE);
+"""
+
+
+def synthetic_text(rng: random.Random, sentences: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+class FakeSnowflake:
+    """In-memory stand-in for ``snowflake.connector``, backed by a shared SQLite database.
+
+    Only the SQL the backend issues is expected to work: ``%s`` placeholders
+    are rewritten to SQLite's ``?``. ``connect`` can be swapped in for
+    ``snowflake.connector.connect``.
+    """
+
+    def __init__(self, connect_latency: float = 0.0, query_latency: float = 0.0):
+        self.connect_latency = connect_latency
+        self.query_latency = query_latency
+        self.connections = 0
+        self.queries = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.executescript(TABLES)
+
+    def seed(self, publications: int, notes_per_publication: int, seed: int = 0) -> List[str]:
+        rng = random.Random(seed)
+        titles = [f"Publication {i:04d}" for i in range(publications)]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO PUBLICATIONS_METADATA VALUES (?, ?, ?, ?, ?, ?);",
+                [
+                    (
+                        title, synthetic_text(rng, 3), f"https://bucket/images/{i}.jpg", f"https://bucket/pdfs/{i}.pdf",
+                        f"https://bucket/images/thumbnails/200/{i}.webp", f"https://bucket/images/thumbnails/400/{i}.webp",
+                    )
+                    for i, title in enumerate(titles)
+                ],
+            )
+            self._db.executemany(
+                "INSERT INTO RESEARCH_NOTES VALUES (?, ?, ?);",
+                [
+                    (title, synthetic_text(rng, 6), f"2024-01-01 {n // 3600:02d}:{n // 60 % 60:02d}:{n % 60:02d}")
+                    for title in titles for n in range(notes_per_publication)
+                ],
+            )
+            self._db.commit()
+        return titles
+
+    def connect(self, **kwargs: Any) -> "FakeConnection":
+        time.sleep(self.connect_latency)
+        with self._lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+    def _execute(self, sql: str, params: Sequence = ()):
+        time.sleep(self.query_latency)
+        sql = sql.replace("%s", "?")
+        with self._lock:
+            self.queries += 1
+            cursor = self._db.execute(sql, tuple(params))
+            return cursor.fetchall()
+
+    def _executemany(self, sql: str, rows: Sequence[Sequence]):
+        time.sleep(self.query_latency)
+        with self._lock:
+            self.queries += 1
+            self._db.executemany(sql.replace("%s", "?"), [tuple(row) for row in rows])
+
+
+class FakeConnection:
+    def __init__(self, server: FakeSnowflake):
+        self._server = server
+
+    def cursor(self) -> "FakeCursor":
+        return FakeCursor(self._server)
+
+    def commit(self):
+        with self._server._lock:
+            self._server.commits += 1
+            self._server._db.commit()
+
+    def rollback(self):
+        with self._server._lock:
+            self._server.rollbacks += 1
+            self._server._db.rollback()
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server: FakeSnowflake):
+        self._server = server
+        self._rows: List[tuple] = []
+
+    def execute(self, sql: str, params: Sequence = ()):
+        if re.match(r"\s*(BEGIN|COMMIT|ROLLBACK|ALTER)\b", sql, re.IGNORECASE):
+            self._rows = []
+        else:
+            self._rows = self._server._execute(sql, params)
+        return self
+
+    def executemany(self, sql: str, rows: Sequence[Sequence]):
+        self._server._executemany(sql, rows)
+        return self
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self) -> List[tuple]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Hashed bag-of-words vectors, so texts sharing words land close together.
+
+    Each call sleeps ``latency`` seconds; a batch costs one call, as it does
+    against the NVIDIA endpoint.
+    """
+
+    dimension: int = Field(default=256)
+    latency: float = Field(default=0.0)
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(model_name="fake-embedding", **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _vector(self, text: str) -> Embedding:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dimension] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def _embed(self, texts: List[str]) -> List[Embedding]:
+        time.sleep(self.latency)
+        with self._lock:
+            self._calls += 1
+        return [self._vector(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed(texts)
+
+
+class FakeLLM(CustomLLM):
+    """Returns a fixed-length answer after ``latency`` plus ``per_token_latency`` per output token."""
+
+    latency: float = Field(default=0.0)
+    per_token_latency: float = Field(default=0.0)
+    output_tokens: int = Field(default=64)
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=8192, num_output=self.output_tokens, model_name="fake-llm")
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _answer(self, prompt: str) -> str:
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+        return " ".join(rng.choice(WORDS) for _ in range(self.output_tokens))
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency + self.per_token_latency * self.output_tokens)
+        with self._lock:
+            self._calls += 1
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+        yield response
+
+
+def install_backend_fakes(main, fake_snowflake: FakeSnowflake, embed_model: BaseEmbedding, llm: CustomLLM):
+    """Point backend.main at the fakes instead of Snowflake and NVIDIA."""
+    import snowflake.connector
+    from llama_index.core import Settings
+    from llama_index.core.node_parser import SentenceSplitter
+
+    def initialize_fake_settings():
+        Settings.embed_model = embed_model
+        Settings.llm = llm
+        Settings.text_splitter = SentenceSplitter(chunk_size=600)
+
+    snowflake.connector.connect = fake_snowflake.connect
+    main.initialize_llama_index_settings = initialize_fake_settings
+
+
+async def wait_until_ready(client, timeout: float = 300.0, interval: float = 0.01) -> float:
+    """Poll /ready and return the seconds it took to answer 200."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if (await client.get("/ready")).status_code == 200:
+            return time.perf_counter() - start
+        await asyncio.sleep(interval)
+    raise TimeoutError("The backend did not become ready.")
+
+
+def make_pdf(pages: List[str], line_width: int = 90) -> bytes:
+    """Build a minimal PDF whose pages hold the given text in Helvetica.
+
+    Hand-written so the benchmarks need no PDF writer, and simple enough that
+    PyPDF2 extracts the text back.
+    """
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        words, lines, line = text.split(), [], ""
+        for word in words:
+            if line and len(line) + len(word) + 1 > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        if line:
+            lines.append(line)
+        content = "BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(f"({escape(l)}) Tj T*" for l in lines) + " ET"
+        content = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_refs)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+def mock_s3():
+    """Start moto's in-process AWS mock; stop it with ``.stop()``."""
+    try:
+        from moto import mock_aws
+    except ImportError as e:
+        raise ImportError("The benchmarks need moto: poetry install --with bench") from e
+    # moto refuses to run against credentials that might be real
+    for name, value in (
+        ("AWS_ACCESS_KEY_ID", "testing"),
+        ("AWS_SECRET_ACCESS_KEY", "testing"),
+        ("AWS_SESSION_TOKEN", "testing"),
+        ("AWS_DEFAULT_REGION", "us-east-1"),
+    ):
+        os.environ[name] = value
+    mock = mock_aws()
+    mock.start()
+    return mock
@@ -0,0 +1,150 @@
+"""Run every offline benchmark and write one JSON result file per commit.
+
+Each benchmark runs in its own process, so global llama_index Settings and
+the S3 mock do not leak between them. Results land in
+backend/benchmarks/results/<timestamp>-<commit>.json; pass an earlier file as
+``--baseline`` to print how the latency and throughput figures moved.
+
+    python -m backend.benchmarks.run_all
+    python -m backend.benchmarks.run_all --quick --baseline backend/benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+BENCHMARKS = {
+    "ingestion": ["--pdfs", "40", "--pages", "8"],
+    "api": ["--concurrency", "8", "--requests", "100"],
+    "vector_store": ["--vectors", "20000", "--queries", "200"],
+    "admission": ["--rate", "40", "--duration", "5"],
+    "startup": ["--notes", "1000"],
+    "metadata_writer": ["--rows", "500"],
+}
+
+QUICK = {
+    "ingestion": ["--pdfs", "5", "--pages", "2"],
+    "api": ["--concurrency", "4", "--requests", "20", "--publications", "10"],
+    "vector_store": ["--vectors", "5000", "--queries", "50", "--dimension", "256"],
+    "admission": ["--rate", "40", "--duration", "2"],
+    "startup": ["--notes", "100", "--import-repeats", "1"],
+    "metadata_writer": ["--rows", "100"],
+}
+
+# Every compared metric has an explicit direction. Paths matching neither list (workload
+# sizes, request counts, status codes, identifiers) are recorded but never compared.
+LOWER_IS_BETTER = [
+    re.compile(r"(_ms|_s|_seconds)(\[\d+\])?$"),
+    re.compile(r"\.(mean|p50|p95|p99)$"),
+    re.compile(r"\.(llm_calls|embedding_calls|executions)$"),
+    re.compile(r"\.snowflake\.(connections|queries)$"),
+    re.compile(r"\.(rejected|timed_out|misses|evictions|stale)$"),
+]
+HIGHER_IS_BETTER = [
+    re.compile(r"(_per_second|\.throughput_rps)$"),
+    re.compile(r"\.(served|hits|hit_ratio|coalesced|fan_out_ratio)$"),
+    re.compile(r"\.recall_at_\d+$"),
+]
+
+
+def direction(path):
+    """Return -1 when lower is better, 1 when higher is better, None when not compared."""
+    if ".config." in path or ".status_codes." in path or "_status" in path:
+        return None
+    if any(pattern.search(path) for pattern in LOWER_IS_BETTER):
+        return -1
+    if any(pattern.search(path) for pattern in HIGHER_IS_BETTER):
+        return 1
+    return None
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(name, args):
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [sys.executable, "-m", f"backend.benchmarks.bench_{name}", *args, "--output", output.name]
+        start = time.perf_counter()
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+        with open(output.name) as f:
+            results = json.load(f)
+        results["wall_seconds"] = time.perf_counter() - start
+        return results
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from flatten(item, f"{prefix}[{i}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, current, threshold):
+    before = dict(flatten(baseline["benchmarks"]))
+    regressions = []
+    for path, value in flatten(current["benchmarks"]):
+        sign = direction(path)
+        if sign is None or path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / abs(before[path])
+        worse = change * sign < -threshold
+        if abs(change) > threshold:
+            print(f"{'REGRESSION' if worse else 'improved  '} {path}: {before[path]:.4g} -> {value:.4g} ({change:+.0%})")
+        if worse:
+            regressions.append(path)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Small sizes, for a smoke run")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change worth reporting")
+    args = parser.parse_args()
+
+    presets = QUICK if args.quick else BENCHMARKS
+    results = {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    for name in args.only or presets:
+        print(f"Running {name}...", flush=True)
+        results["benchmarks"][name] = run_benchmark(name, presets[name])
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{(results['commit'] or 'unknown')[:10]}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
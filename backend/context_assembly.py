@@ -0,0 +1,132 @@
+import re
+import math
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text))
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _words(text)
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def context_str(nodes: List[NodeWithScore]) -> str:
+    # Mirrors how the compact response synthesizer joins chunks into the prompt
+    return "\n\n".join(n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes)
+
+
+def prompt_tokens(nodes: List[NodeWithScore], question: str) -> int:
+    return count_tokens(DEFAULT_TEXT_QA_PROMPT.format(context_str=context_str(nodes), query_str=question))
+
+
+class ContextCompressor(BaseNodePostprocessor):
+    """Fit retrieved chunks into a token budget before they reach the LLM.
+
+    Chunks are visited from the highest retrieval score down. A chunk that
+    mostly repeats one already kept is dropped. If the rest do not fit, they
+    are trimmed to the sentences sharing the most question terms (weighted by
+    how rare each term is among the retrieved sentences), kept in their
+    original order, until the budget is spent. Scoring is lexical, so
+    compression never calls the embedding endpoint. ``report`` describes the
+    last call, so use one instance per request.
+    """
+
+    token_budget: int = Field(default=1200, description="Maximum tokens of context passed to the LLM.")
+    max_sentences_per_chunk: int = Field(default=8)
+    overlap_threshold: float = Field(default=0.6, description="Shingle containment above which a chunk is a duplicate.")
+
+    _report: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextCompressor"
+
+    @property
+    def report(self) -> dict:
+        return self._report
+
+    def _deduplicate(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        kept, kept_shingles = [], []
+        for node in nodes:
+            shingles = _shingles(node.node.get_content())
+            if any(len(shingles & other) / max(len(shingles), 1) >= self.overlap_threshold for other in kept_shingles):
+                continue
+            kept.append(node)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _postprocess_nodes(
+        self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        ranked = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
+        unique = self._deduplicate(ranked)
+        if count_tokens(context_str(unique)) <= self.token_budget:
+            self._set_report(nodes, unique, unique)
+            return unique
+
+        chunk_sentences = [
+            [s for s in SENTENCE_BOUNDARY.split(n.node.get_content()) if s.strip()] for n in unique
+        ]
+        sentence_scores = self._score_sentences(chunk_sentences, query_bundle)
+
+        compressed, used = [], 0
+        for node, sentences, scores in zip(unique, chunk_sentences, sentence_scores):
+            if used >= self.token_budget:
+                break
+            # Keep the best sentences that still fit, then restore their reading order
+            chosen, chunk_tokens = [], 0
+            for i in np.argsort(-scores, kind="stable")[: self.max_sentences_per_chunk]:
+                sentence_tokens = count_tokens(sentences[i])
+                if used + chunk_tokens + sentence_tokens > self.token_budget:
+                    continue
+                chosen.append(i)
+                chunk_tokens += sentence_tokens
+            if not chosen:
+                continue
+            trimmed = node.node.model_copy()
+            trimmed.set_content(" ".join(sentences[i] for i in sorted(chosen)))
+            compressed.append(NodeWithScore(node=trimmed, score=node.score))
+            used += chunk_tokens
+
+        self._set_report(nodes, unique, compressed)
+        return compressed
+
+    def _set_report(self, nodes: List[NodeWithScore], unique: List[NodeWithScore], compressed: List[NodeWithScore]):
+        # Both sizes count the joined text the synthesizer actually puts in the prompt
+        self._report = {
+            "chunks_retrieved": len(nodes),
+            "chunks_deduplicated": len(nodes) - len(unique),
+            "chunks_used": len(compressed),
+            "context_tokens_before": count_tokens(context_str(nodes)),
+            "context_tokens_after": count_tokens(context_str(compressed)),
+        }
+
+    def _score_sentences(self, chunk_sentences: List[List[str]], query_bundle: Optional[QueryBundle]) -> List[np.ndarray]:
+        flat = [set(_words(s)) for sentences in chunk_sentences for s in sentences]
+        query_terms = set(_words(query_bundle.query_str)) if query_bundle is not None else set()
+        if not flat or not query_terms:
+            # Without a question, keep sentences in document order
+            scores = -np.arange(len(flat), dtype=float)
+        else:
+            document_frequency = Counter(term for words in flat for term in words & query_terms)
+            idf = {term: math.log(1 + len(flat) / count) for term, count in document_frequency.items()}
+            scores = np.array([sum(idf[term] for term in words & query_terms) for words in flat])
+
+        split_at = np.cumsum([len(sentences) for sentences in chunk_sentences])[:-1]
+        return np.split(scores, split_at)
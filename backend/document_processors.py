@@ -19,15 +19,20 @@ def init_s3():
     )
     return s3, bucket_name
 
-# Retrieve all PDF documents in /pdfs folder from S3 bucket
-def get_all_pdf_documents():
-    """Retrieve all PDF files from the /pdfs folder in S3 and extract text."""
-    s3, bucket_name = init_s3()
-    all_pdf_documents = []
+# List the keys of all PDF files in the /pdfs folder of the S3 bucket
+def list_pdf_keys(s3, bucket_name):
+    paginator = s3.get_paginator('list_objects_v2')
+    pdf_files = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix="pdfs/"):
+        pdf_files.extend(content['Key'] for content in page.get('Contents', []) if content['Key'].endswith('.pdf'))
+    return pdf_files
 
-    # 列出 /pdfs 資料夾中的所有 PDF 文件
-    response = s3.list_objects_v2(Bucket=bucket_name, Prefix="pdfs/")
-    pdf_files = [content['Key'] for content in response.get('Contents', []) if content['Key'].endswith('.pdf')]
+# Retrieve the given PDF files from S3 and extract their text
+def get_pdf_documents(pdf_files, s3=None, bucket_name=None):
+    """Retrieve the given PDF keys from S3 and extract text."""
+    if s3 is None:
+        s3, bucket_name = init_s3()
+    all_pdf_documents = []
 
     # 處理每一個 PDF 文件
     for s3_key in pdf_files:
@@ -61,3 +66,12 @@ def get_all_pdf_documents():
             print(f"Error opening or processing the PDF file from S3 ({s3_key}): {e}")
 
     return all_pdf_documents
+
+# Retrieve all PDF documents in /pdfs folder from S3 bucket
+def get_all_pdf_documents():
+    """Retrieve all PDF files from the /pdfs folder in S3 and extract text."""
+    s3, bucket_name = init_s3()
+
+    # 列出 /pdfs 資料夾中的所有 PDF 文件
+    pdf_files = list_pdf_keys(s3, bucket_name)
+    return get_pdf_documents(pdf_files, s3, bucket_name)
@@ -0,0 +1,329 @@
+import os
+import json
+import fcntl
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache")
+
+
+class EmbeddingStore:
+    """Fixed-capacity LRU store of float32 vectors kept on disk.
+
+    Vectors live in a memory-mapped ``vectors.f32`` matrix with one row per
+    slot; ``index.json`` maps each key to its slot, ordered from least to most
+    recently used. When the store is full the least recently used slot is reused.
+    ``keys.bin`` holds the SHA-256 of the key written to each slot and is checked
+    on every read, so an index that is older than the slots (after a crash, or
+    when another process reused the slot) yields a miss, never another key's
+    vector. Writers sharing a directory serialise on ``lock`` with ``flock``
+    and merge each other's entries into ``index.json`` when they persist.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 50000, persist_every: int = 256):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.persist_every = persist_every
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.tags_path = os.path.join(cache_dir, "keys.bin")
+        self.dimension = None
+        self.entries = OrderedDict()
+        self.free_slots = []
+        self.vectors = None
+        self.tags = None
+        self.evictions = 0
+        self.stale = 0
+        self._orphans = set()
+        self._dirty = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(cache_dir, "lock"), "a")
+        with self._file_lock(exclusive=False):
+            self._load()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _tag(key: str) -> bytes:
+        return hashlib.sha256(key.encode("utf-8")).digest()
+
+    def _load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index["capacity"] > self.max_entries:
+                logging.info("Embedding cache capacity was reduced, starting with an empty cache.")
+                return
+            if not os.path.exists(self.tags_path):
+                # Caches written before slots were tagged cannot be verified
+                logging.info("Embedding cache has no slot keys, starting with an empty cache.")
+                return
+            self._open_vectors(index["dimension"])
+            self.entries = OrderedDict((key, slot) for key, slot in index["entries"])
+            used = set(self.entries.values())
+            unused = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+            # Tagged slots missing from the index were written after the last persist; they are
+            # reused last, so slots another writer is filling right now are not taken first
+            tagged = self.tags.any(axis=1)
+            self._orphans = {slot for slot in unused if tagged[slot]}
+            self.free_slots = [slot for slot in unused if tagged[slot]] + [slot for slot in unused if not tagged[slot]]
+            logging.info(f"Loaded {len(self.entries)} cached embeddings from {self.cache_dir}.")
+        except Exception as e:
+            logging.error(f"Failed to load embedding cache, starting with an empty cache: {e}")
+            self.dimension = None
+            self.vectors = None
+            self.tags = None
+            self.entries = OrderedDict()
+            self.free_slots = []
+            self._orphans = set()
+
+    def _open_vectors(self, dimension: int):
+        # Growing the files keeps existing rows; new rows are sparse (all zero) until written
+        for path, row_size in ((self.vectors_path, dimension * 4), (self.tags_path, 32)):
+            size = self.max_entries * row_size
+            mode = "r+b" if os.path.exists(path) else "w+b"
+            with open(path, mode) as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < size:
+                    f.truncate(size)
+        self.dimension = dimension
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.max_entries, dimension))
+        self.tags = np.memmap(self.tags_path, dtype=np.uint8, mode="r+", shape=(self.max_entries, 32))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Embedding]:
+        with self._lock:
+            slot = self.entries.get(key)
+            if slot is None:
+                return None
+            with self._file_lock(exclusive=False):
+                if self.tags[slot].tobytes() != self._tag(key):
+                    # The slot now holds another key, written by another process or after a crash
+                    del self.entries[key]
+                    self.stale += 1
+                    return None
+                vector = self.vectors[slot].tolist()
+            self.entries.move_to_end(key)
+            return vector
+
+    def _claim_slot(self) -> Optional[int]:
+        while self.free_slots:
+            slot = self.free_slots.pop()
+            # A tagged slot we did not leave behind was taken by another writer since we loaded
+            if not self.tags[slot].any() or slot in self._orphans:
+                self._orphans.discard(slot)
+                return slot
+        while self.entries:
+            key, slot = self.entries.popitem(last=False)
+            # Writers that loaded the same index evict in the same order; skip slots one already took
+            if self.tags[slot].tobytes() == self._tag(key):
+                self.evictions += 1
+                return slot
+            self.stale += 1
+        return None
+
+    def put(self, key: str, vector: Embedding):
+        with self._lock, self._file_lock(exclusive=True):
+            if self.vectors is None:
+                self._open_vectors(len(vector))
+                self.free_slots = [slot for slot in range(self.max_entries - 1, -1, -1) if not self.tags[slot].any()]
+            if len(vector) != self.dimension:
+                raise ValueError(f"Embedding dimension {len(vector)} does not match cache dimension {self.dimension}.")
+
+            if key in self.entries:
+                slot = self.entries[key]
+                self.entries.move_to_end(key)
+            else:
+                slot = self._claim_slot()
+                if slot is None:
+                    return
+            # Untag first so an interrupted write never pairs the old key with the new vector
+            self.tags[slot] = 0
+            self.vectors[slot] = vector
+            self.tags[slot] = np.frombuffer(self._tag(key), dtype=np.uint8)
+            self.entries[key] = slot
+            self._dirty += 1
+            if self._dirty >= self.persist_every:
+                self._persist()
+
+    def persist(self):
+        with self._lock, self._file_lock(exclusive=True):
+            self._persist()
+
+    def _merge_persisted(self):
+        # Adopt entries other writers persisted since we loaded, while their slot still holds their key
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get("capacity") != self.max_entries or index.get("dimension") != self.dimension:
+            return
+        used = set(self.entries.values())
+        adopted = OrderedDict()
+        for key, slot in index["entries"]:
+            if key not in self.entries and slot not in used and self.tags[slot].tobytes() == self._tag(key):
+                adopted[key] = slot
+                used.add(slot)
+        if adopted:
+            # Our own entries stay the most recently used
+            adopted.update(self.entries)
+            self.entries = adopted
+            self._orphans -= used
+            self.free_slots = [slot for slot in self.free_slots if slot not in used]
+
+    def _persist(self):
+        if self.vectors is None or not self._dirty:
+            return
+        self._merge_persisted()
+        self.vectors.flush()
+        self.tags.flush()
+        index = {
+            "dimension": self.dimension,
+            "capacity": self.max_entries,
+            "entries": list(self.entries.items()),
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = 0
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated texts from an ``EmbeddingStore``.
+
+    Cache keys hash the wrapped model's name and truncate mode together with
+    the text, and keep query and passage embeddings apart because asymmetric
+    models such as ``nv-embedqa`` embed them differently.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+    _namespace: str = PrivateAttr()
+    _stats_lock: Any = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, embed_model: BaseEmbedding, store: EmbeddingStore, **kwargs: Any):
+        model_name = getattr(embed_model, "model", None) or embed_model.model_name
+        super().__init__(
+            model_name=model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._store = store
+        self._namespace = f"{model_name}\0{getattr(embed_model, 'truncate', None)}"
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def store(self) -> EmbeddingStore:
+        return self._store
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "entries": len(self._store),
+            "capacity": self._store.max_entries,
+            "evictions": self._store.evictions,
+            "stale": self._store.stale,
+        }
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self._namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, text) for text in texts]
+        embeddings = [self._store.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        with self._stats_lock:
+            self._hits += len(texts) - len(missing)
+            self._misses += len(missing)
+        return keys, embeddings, missing
+
+    def _fill(self, texts, keys, embeddings, missing, unique_texts, computed) -> List[Embedding]:
+        by_text = dict(zip(unique_texts, computed))
+        for i in missing:
+            embeddings[i] = by_text[texts[i]]
+            self._store.put(keys[i], embeddings[i])
+        return embeddings
+
+    def _cached(self, kind: str, texts: List[str], compute: Callable[[List[str]], List[Embedding]]) -> List[Embedding]:
+        keys, embeddings, missing = self._lookup(kind, texts)
+        if missing:
+            # Duplicate texts within one batch are only sent to the model once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            self._fill(texts, keys, embeddings, missing, unique_texts, compute(unique_texts))
+        return embeddings
+
+    async def _acached(self, kind: str, texts: List[str], compute) -> List[Embedding]:
+        keys, embeddings, missing = self._lookup(kind, texts)
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            self._fill(texts, keys, embeddings, missing, unique_texts, await compute(unique_texts))
+        return embeddings
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._cached(
+            "query", [query], lambda texts: [self._embed_model._get_query_embedding(texts[0])]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        async def compute(texts):
+            return [await self._embed_model._aget_query_embedding(texts[0])]
+
+        return (await self._acached("query", [query], compute))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._cached("text", texts, self._embed_model._get_text_embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._acached("text", texts, self._embed_model._aget_text_embeddings)
+
+
+def wrap_with_cache(embed_model: BaseEmbedding) -> BaseEmbedding:
+    """Wrap ``embed_model`` with the on-disk cache configured by environment variables."""
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "false":
+        return embed_model
+    store = EmbeddingStore(
+        cache_dir=os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR),
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000")),
+    )
+    atexit.register(store.persist)
+    return CachedEmbedding(embed_model, store)
@@ -0,0 +1,61 @@
+import gc
+import os
+import time
+import glob
+import logging
+import tempfile
+import multiprocessing
+
+# Multi-worker deployment: gunicorn -c backend/gunicorn.conf.py backend.main:app
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# Import the app in the master so the workers share its memory through fork
+preload_app = True
+
+# Workers publish their metrics here so /metrics on any worker reports all of them.
+# Set before the app is imported, which preload_app does right after reading this file.
+os.environ.setdefault("METRICS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="backend-metrics-"))
+
+
+# Build the index once before the workers are forked
+def on_starting(server):
+    from backend.main import preload_shared_state
+
+    # Snapshots left by an earlier run would be counted as live workers
+    for path in glob.glob(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "*.json")):
+        os.remove(path)
+
+    attempts = int(os.getenv("PRELOAD_ATTEMPTS", "5"))
+    delay = 1.0
+    for attempt in range(1, attempts + 1):
+        try:
+            preload_shared_state()
+            break
+        except Exception as e:
+            logging.error(f"Preloading shared state failed (attempt {attempt}/{attempts}): {str(e)}")
+            if attempt == attempts:
+                # Workers would each rebuild the index on their own, so stop instead
+                raise RuntimeError("Could not preload the index for the workers.") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    # Keep the preloaded objects out of the collector so it does not dirty the shared pages
+    gc.freeze()
+
+
+# Undo what each worker inherits from the master but must not share
+def post_fork(server, worker):
+    from backend.main import llm_admission
+    from backend.metrics import registry
+
+    # The master's preload spans would otherwise be counted once per worker
+    registry.reset()
+
+    # LLM_MAX_CONCURRENCY and LLM_MAX_QUEUE are per host, so each worker gets its share.
+    # Every worker keeps at least one slot, so the host total exceeds them if WEB_CONCURRENCY is larger.
+    llm_admission.max_concurrency = max(1, llm_admission.max_concurrency // server.num_workers)
+    llm_admission.max_queue = max(1, llm_admission.max_queue // server.num_workers)
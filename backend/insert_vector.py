@@ -1,13 +1,15 @@
 # insert_vector.py
 import os
+import sys
 from pinecone import Pinecone
 from dotenv import load_dotenv
 from llama_index.core import Settings  # Updated import
 from llama_index.core import VectorStoreIndex, StorageContext
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.vector_stores.pinecone import PineconeVectorStore
 from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from document_processors import get_all_pdf_documents
+from document_processors import get_all_pdf_documents, get_pdf_documents
+from embedding_cache import CachedEmbedding, wrap_with_cache
+from vector_stores import create_vector_store
 import logging
 
 load_dotenv()
@@ -22,11 +24,12 @@ def initialize_pinecone_connection():
         raise
 
 def initialize_llama_index_settings():
-    Settings.embed_model = NVIDIAEmbedding(
+    # Re-indexing unchanged chunks is served from the on-disk embedding cache
+    Settings.embed_model = wrap_with_cache(NVIDIAEmbedding(
         model="nvidia/nv-embedqa-e5-v5", 
         truncate="END",
         api_key=os.getenv("NVIDIA_API_KEY")
-    )
+    ))
     Settings.text_splitter = SentenceSplitter(chunk_size=1500)
     logging.info("llama_index settings initialized successfully.")
 
@@ -34,12 +37,8 @@ def initialize_llama_index_settings():
 
 def create_llama_index(documents):
     try:
-        # Initialize Pinecone Vector Store
-        vector_store = PineconeVectorStore(
-            index_name=os.getenv("PINECONE_INDEX_NAME"),
-            dimension=768  # Ensure this matches the embedding dimension
-        )
-        logging.info("PineconeVectorStore initialized successfully.")
+        # Initialize the configured vector store (Pinecone or local)
+        vector_store = create_vector_store()
 
         # Create StorageContext with the VectorStore
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
@@ -49,22 +48,18 @@ def create_llama_index(documents):
             documents,
             storage_context=storage_context
         )
-        logging.info("VectorStoreIndex created successfully with Pinecone.")
+        logging.info(f"VectorStoreIndex created successfully with {vector_store.class_name()}.")
         logging.info(f"Total documents indexed: {len(documents)}")
         
         return index
     except Exception as e:
-        logging.error(f"Failed to create VectorStoreIndex with Pinecone: {e}")
+        logging.error(f"Failed to create VectorStoreIndex: {e}")
         raise
 
 def create_llama_index(documents):
     try:
-        # Initialize Pinecone Vector Store
-        vector_store = PineconeVectorStore(
-            index_name=os.getenv("PINECONE_INDEX_NAME"),
-            dimension=768  # Ensure this matches the embedding dimension
-        )
-        logging.info("PineconeVectorStore initialized successfully.")
+        # Initialize the configured vector store (Pinecone or local)
+        vector_store = create_vector_store()
 
         # Create StorageContext with the VectorStore
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
@@ -74,16 +69,22 @@ def create_llama_index(documents):
             documents,
             storage_context=storage_context
         )
-        logging.info("VectorStoreIndex created successfully with Pinecone.")
+        logging.info(f"VectorStoreIndex created successfully with {vector_store.class_name()}.")
         logging.info(f"Total documents indexed: {len(documents)}")
         
     except Exception as e:
-        logging.error(f"Failed to create VectorStoreIndex with Pinecone: {e}")
+        logging.error(f"Failed to create VectorStoreIndex: {e}")
         raise    
 
 if __name__ == "__main__":
     # 假設 S3 keys 是一個包含所有 PDF 文件 S3 key 的清單
-    initialize_pinecone_connection()
+    # Pass S3 keys on the command line to ingest only those PDFs
+    if os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower() == "pinecone":
+        initialize_pinecone_connection()
     initialize_llama_index_settings()
-    documents = get_all_pdf_documents()
-    create_llama_index(documents)
\ No newline at end of file
+    s3_keys = sys.argv[1:]
+    documents = get_pdf_documents(s3_keys) if s3_keys else get_all_pdf_documents()
+    create_llama_index(documents)
+    if isinstance(Settings.embed_model, CachedEmbedding):
+        Settings.embed_model.store.persist()
+        logging.info(f"Embedding cache stats: {Settings.embed_model.stats()}")
@@ -1,22 +1,24 @@
 import os
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import snowflake.connector
+import json
+import time
+import uuid
+import threading
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import logging
 from contextlib import asynccontextmanager
 from typing import List
 
-# Import llama_index components
-from llama_index.core import Settings
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from llama_index.llms.nvidia import NVIDIA
-
-from pinecone import Pinecone
-from llama_index.core.schema import Document as LlamaDocument
+# llama_index, the NVIDIA and Pinecone clients and the Snowflake connector take
+# seconds to import, so they are imported where first used rather than here.
+# That keeps the app able to serve /health and /documents while the index loads.
+from backend.request_coalescing import SingleFlight, normalize_question
+from backend.admission import AdmissionController, Overloaded, INTERACTIVE, BACKGROUND
+from backend.metrics import registry, span, record_token_usage, request_id_var, endpoint_var, multiprocess_dir
+from backend.shared_cache import create_cache, cached
 
 # Load environment variables
 load_dotenv()
@@ -33,17 +35,53 @@ app = FastAPI()
 # Global variable to hold the index
 llama_index = None
 
+# Index loaded by the gunicorn master before it forks the workers (see gunicorn.conf.py)
+preloaded_index = None
+
+# Set once the index is loaded; until then the endpoints that need it answer 503
+index_ready = threading.Event()
+startup_error = None
+
+# Cached embedding model, kept for its hit/miss counters
+cached_embed_model = None
+
+# Identical concurrent questions share one retrieval and LLM generation
+ask_flight = SingleFlight("ask")
+search_flight = SingleFlight("search_full_text")
+
+# Answers and publication metadata, kept in Redis when SHARED_CACHE_URL is set so all workers share them
+answer_cache = create_cache("answers", float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300")))
+metadata_cache = create_cache("metadata", float(os.getenv("METADATA_CACHE_TTL_SECONDS", "300")))
+
+# Bounded, prioritised queue in front of the NVIDIA LLM and embedding endpoints. The limits
+# are per host: under gunicorn, post_fork in gunicorn.conf.py divides them between the workers.
+llm_admission = AdmissionController(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    default_deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "30")),
+)
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    logging.warning(f"LLM request not served: {e.reason}")
+    return HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+def not_ready_error() -> HTTPException:
+    return HTTPException(status_code=503, detail="The index is still loading.", headers={"Retry-After": "5"})
+
 # Initialize Snowflake connection
 def init_snowflake():
+    import snowflake.connector
+
     try:
-        conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=os.getenv('SNOWFLAKE_SCHEMA'),
-        )
+        with span("snowflake_connect"):
+            conn = snowflake.connector.connect(
+                user=os.getenv('SNOWFLAKE_USER'),
+                password=os.getenv('SNOWFLAKE_PASSWORD'),
+                account=os.getenv('SNOWFLAKE_ACCOUNT'),
+                warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+                database=os.getenv('SNOWFLAKE_DATABASE'),
+                schema=os.getenv('SNOWFLAKE_SCHEMA'),
+            )
         logging.info("Connected to Snowflake successfully.")
         return conn
     except Exception as e:
@@ -52,11 +90,21 @@ def init_snowflake():
 
 # Initialize llama_index Settings
 def initialize_llama_index_settings():
-    Settings.embed_model = NVIDIAEmbedding(
+    from llama_index.core import Settings
+    from llama_index.core.node_parser import SentenceSplitter
+    from llama_index.embeddings.nvidia import NVIDIAEmbedding
+    from llama_index.llms.nvidia import NVIDIA
+    from backend.embedding_cache import CachedEmbedding, wrap_with_cache
+
+    global cached_embed_model
+    # Repeated texts and questions are served from the on-disk embedding cache
+    Settings.embed_model = wrap_with_cache(NVIDIAEmbedding(
         model="nvidia/nv-embedqa-e5-v5", 
         truncate="END",
         api_key=os.getenv("NVIDIA_API_KEY")
-    )
+    ))
+    if isinstance(Settings.embed_model, CachedEmbedding):
+        cached_embed_model = Settings.embed_model
     Settings.llm = NVIDIA(
         model="meta/llama-3.2-3b-instruct",
         api_key=os.getenv("NVIDIA_API_KEY")
@@ -66,6 +114,8 @@ def initialize_llama_index_settings():
 
 # Initialize Pinecone connection
 def initialize_pinecone_connection():
+    from pinecone import Pinecone
+
     try:
         Pinecone(api_key=os.getenv("PINECONE_API_KEY"), environment=os.getenv("PINECONE_ENV"))
         logging.info("Connected to Pinecone successfully.")
@@ -73,23 +123,39 @@ def initialize_pinecone_connection():
         logging.error(f"Failed to connect to Pinecone: {e}")
         raise
 
-# Create and initialize the index using llama_index with Pinecone
-def create_llama_index(documents):
+# Create and initialize the index using llama_index with the configured vector store
+def create_llama_index(documents, vector_store=None):
+    from llama_index.core import VectorStoreIndex, StorageContext
+    from backend.vector_stores import create_vector_store
+
     try:
-        vector_store = PineconeVectorStore(
-            index_name=os.getenv("PINECONE_INDEX_NAME"),
-            dimension=768
-        )
+        vector_store = vector_store or create_vector_store()
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
         index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-        logging.info("VectorStoreIndex created successfully with Pinecone.")
+        logging.info(f"VectorStoreIndex created successfully with {vector_store.class_name()}.")
         return index
     except Exception as e:
-        logging.error(f"Failed to create VectorStoreIndex with Pinecone: {e}")
+        logging.error(f"Failed to create VectorStoreIndex: {e}")
         raise
 
+# Attach to an already populated vector store instead of re-embedding every note
+def attach_llama_index():
+    from llama_index.core import VectorStoreIndex
+    from backend.vector_stores import create_vector_store
+
+    vector_store = create_vector_store()
+    # Only the local store can tell that it is empty; Pinecone is assumed populated
+    if hasattr(vector_store, "count") and vector_store.count() == 0 and not vector_store.read_only:
+        logging.info("Vector store is empty, building it from Snowflake.")
+        return create_llama_index(load_documents_from_snowflake(), vector_store)
+    index = VectorStoreIndex.from_vector_store(vector_store)
+    logging.info(f"Attached to the existing {vector_store.class_name()}.")
+    return index
+
 # Load documents from Snowflake
 def load_documents_from_snowflake():
+    from llama_index.core.schema import Document as LlamaDocument
+
     try:
         conn = init_snowflake()
         cursor = conn.cursor()
@@ -107,24 +173,198 @@ def load_documents_from_snowflake():
         logging.error(f"Error loading documents from Snowflake: {e}")
         raise
 
+# Re-embed the research notes from Snowflake into the configured vector store
+def rebuild_llama_index():
+    from backend.vector_stores import create_vector_store
+
+    documents = load_documents_from_snowflake()
+    vector_store = create_vector_store()
+    if hasattr(vector_store, "count"):
+        # The local store persists across restarts, so replace the rows an earlier rebuild left
+        for doc_id in {document.doc_id for document in documents}:
+            vector_store.delete(doc_id)
+    return create_llama_index(documents, vector_store)
+
+# INDEX_STARTUP_MODE, defaulting to attach for the local store, which is persisted on disk
+def index_startup_mode() -> str:
+    default = "attach" if os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower() == "local" else "rebuild"
+    return os.getenv("INDEX_STARTUP_MODE", default).lower()
+
+# Connect the models and load the index, rebuilding it from Snowflake unless told to attach
+def initialize_index():
+    global llama_index
+    if os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower() == "pinecone":
+        initialize_pinecone_connection()
+    # Model clients hold connection pools, so every process creates its own
+    initialize_llama_index_settings()
+    if preloaded_index is not None:
+        llama_index = preloaded_index
+    elif index_startup_mode() == "attach":
+        llama_index = attach_llama_index()
+    else:
+        llama_index = rebuild_llama_index()
+
+# Add chunked nodes to the index. Gunicorn workers share the local store read-only, so a
+# worker embeds the nodes first, then appends them under the store's exclusive lock, one
+# writer at a time, and re-attaches; the other workers re-attach in refresh_index_periodically
+def add_to_index(nodes):
+    global llama_index
+    from llama_index.core import Settings
+    from llama_index.core.indices.utils import embed_nodes
+    from backend.vector_stores import create_vector_store
+
+    vector_store = llama_index.vector_store
+    if not getattr(vector_store, "read_only", False):
+        llama_index.insert_nodes(nodes)
+        return
+    embeddings = embed_nodes(nodes, Settings.embed_model)
+    for node in nodes:
+        node.embedding = embeddings[node.node_id]
+    with vector_store.file_lock(exclusive=True):
+        create_vector_store(read_only=False).add(nodes)
+    llama_index = attach_llama_index()
+
+# Re-attach to the shared local store whenever another worker has written to it
+def refresh_index_periodically(stop: threading.Event):
+    global llama_index
+    interval = float(os.getenv("LOCAL_VECTOR_STORE_REFRESH_SECONDS", "5"))
+    while not stop.wait(interval):
+        if not index_ready.is_set() or not llama_index.vector_store.is_stale():
+            continue
+        try:
+            llama_index = attach_llama_index()
+        except Exception as e:
+            logging.error(f"Failed to re-attach to the local vector store: {e}")
+
+# Load the index off the event loop, retrying with backoff until it succeeds
+def initialize_index_in_background(stop: threading.Event):
+    global startup_error
+    endpoint_var.set("startup")
+    delay = 1.0
+    while not stop.is_set():
+        try:
+            with span("initialize_index"):
+                initialize_index()
+            startup_error = None
+            index_ready.set()
+            logging.info("Index loaded, the service is ready.")
+            return
+        except Exception as e:
+            startup_error = str(e)
+            logging.error(f"Failed to initialize the index, retrying in {delay:.0f}s: {e}")
+            stop.wait(delay)
+            delay = min(delay * 2, 60)
+
+# Multi-worker mode: build the index once in the gunicorn master, then hand workers a
+# read-only view of the local store, memory-mapped from disk (written through add_to_index)
+def preload_shared_state():
+    global llama_index, preloaded_index
+    endpoint_var.set("preload")
+    with span("preload_shared_state"):
+        initialize_index()
+    if cached_embed_model is not None:
+        # Workers load what the master embedded and keep adding to the same files under its lock
+        cached_embed_model.store.persist()
+    os.environ["INDEX_STARTUP_MODE"] = "attach"
+    if hasattr(llama_index.vector_store, "read_only"):
+        llama_index.vector_store.persist()
+        os.environ["LOCAL_VECTOR_STORE_READ_ONLY"] = "true"
+        # Loaded once here and inherited by every worker through fork
+        preloaded_index = attach_llama_index()
+    llama_index = None
+    logging.info("Shared state preloaded for the workers.")
+
 # Lifespan Event Handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global llama_index
+    stop = threading.Event()
+    index_ready.clear()
+    # Start accepting connections straight away; the index loads in the background
+    threading.Thread(target=initialize_index_in_background, args=(stop,), name="index-init", daemon=True).start()
+    if os.getenv("LOCAL_VECTOR_STORE_READ_ONLY", "false").lower() == "true":
+        threading.Thread(target=refresh_index_periodically, args=(stop,), name="index-refresh", daemon=True).start()
+    if multiprocess_dir() is not None:
+        threading.Thread(target=registry.write_snapshots, args=(stop,), name="metrics-snapshot", daemon=True).start()
     try:
-        initialize_pinecone_connection()
-        initialize_llama_index_settings()
-        documents = load_documents_from_snowflake()
-        llama_index = create_llama_index(documents)
         yield
     finally:
-        if llama_index:
-            del llama_index
+        stop.set()
+        llama_index = None
+        if cached_embed_model is not None:
+            cached_embed_model.store.persist()
+            logging.info(f"Embedding cache stats: {cached_embed_model.stats()}")
         logging.info("Application shutdown complete.")
 
 # Attach the lifespan to the FastAPI app
 app = FastAPI(lifespan=lifespan)
 
+# Component counters, read at scrape time
+registry.gauge_callback("llm_admission", "LLM admission queue counters.", llm_admission.stats, label="stat")
+registry.gauge_callback("request_coalescing_ask", "Coalescing counters for /ask.", ask_flight.stats, label="stat")
+registry.gauge_callback(
+    "request_coalescing_search_full_text", "Coalescing counters for /search_full_text.", search_flight.stats, label="stat"
+)
+registry.gauge_callback("answer_cache", "Answer cache counters.", answer_cache.stats, label="stat")
+registry.gauge_callback("metadata_cache", "Publication metadata cache counters.", metadata_cache.stats, label="stat")
+registry.gauge_callback(
+    "embedding_cache", "Embedding cache counters.",
+    lambda: cached_embed_model.stats() if cached_embed_model is not None else {}, label="stat",
+)
+
+# Route template such as /documents/{title:path}/page, so titles do not become labels
+def route_template(request: Request) -> str:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+# Tag every request with an ID, visible to its timing spans, and record its duration
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    endpoint = route_template(request)
+    request_id_var.set(request_id)
+    endpoint_var.set(endpoint)
+
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe(
+            "http_request_duration_seconds", duration,
+            endpoint=endpoint, method=request.method, status=str(status_code),
+        )
+        logging.info(
+            f"request_id={request_id} method={request.method} endpoint={endpoint} "
+            f"status={status_code} duration_ms={duration * 1000:.2f}"
+        )
+
+# Liveness: the process is up and answering
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+# Readiness: the index is loaded and every endpoint can be served
+@app.get("/ready")
+async def ready():
+    if index_ready.is_set():
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=503, content={"status": "starting", "error": startup_error}, headers={"Retry-After": "5"}
+    )
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Data Models
 class ModifiedAnswerRequest(BaseModel):
     title: str
@@ -134,19 +374,41 @@ class ResearchNoteResponse(BaseModel):
     title: str
     notes: List[str]
 
+# Embed a saved note so questions retrieve it without waiting for a rebuild. Same doc_id and
+# metadata as load_documents_from_snowflake, so a rebuild replaces it rather than duplicating it.
+def index_research_note(title: str, note_text: str):
+    from llama_index.core import Settings
+    from llama_index.core.schema import Document as LlamaDocument
+
+    document = LlamaDocument(doc_id=title, text=note_text, metadata={"title": title})
+    with span("embed_and_insert"):
+        add_to_index(Settings.text_splitter.get_nodes_from_documents([document]))
+
 # Save Modified Answer as Research Note
 @app.post("/save_modified_answer")
-async def save_modified_answer(request: ModifiedAnswerRequest):
+def save_modified_answer(request: ModifiedAnswerRequest):
     try:
         conn = init_snowflake()
         cursor = conn.cursor()
         insert_query = "INSERT INTO RESEARCH_NOTES (TITLE, NOTE_TEXT) VALUES (%s, %s);"
-        cursor.execute(insert_query, (request.title, request.modified_answer))
-        conn.commit()
+        if has_columns(cursor, "RESEARCH_NOTES", "CREATED_AT"):
+            insert_query = "INSERT INTO RESEARCH_NOTES (TITLE, NOTE_TEXT, CREATED_AT) VALUES (%s, %s, CURRENT_TIMESTAMP);"
+        with span("snowflake_query"):
+            cursor.execute(insert_query, (request.title, request.modified_answer))
+            conn.commit()
         cursor.close()
         conn.close()
         logging.info(f"Modified answer saved as research note for document '{request.title}'.")
 
+        # The note is stored either way; only its retrieval waits for the next rebuild
+        if index_ready.is_set():
+            try:
+                index_research_note(request.title, request.modified_answer)
+            except Exception as e:
+                logging.error(f"Error adding the research note to the index: {e}")
+        else:
+            logging.warning("The index is still loading, the research note is indexed at the next rebuild.")
+
         # Retrieve all saved research notes for this document
         research_notes = get_research_notes(request.title)
         return {"status": "Modified answer saved successfully", "research_notes": research_notes}
@@ -155,7 +417,7 @@ async def save_modified_answer(request: ModifiedAnswerRequest):
         raise HTTPException(status_code=500, detail="An error occurred while saving the modified answer.")
 
 # Fetch Research Notes for a Document
-@app.get("/view_research_notes/{title}", response_model=ResearchNoteResponse)
+@app.get("/view_research_notes/{title:path}", response_model=ResearchNoteResponse)
 async def view_research_notes(title: str):
     try:
         research_notes = get_research_notes(title)
@@ -170,8 +432,9 @@ def get_research_notes(title: str) -> List[str]:
         conn = init_snowflake()
         cursor = conn.cursor()
         query = "SELECT NOTE_TEXT FROM RESEARCH_NOTES WHERE TITLE = %s;"
-        cursor.execute(query, (title,))
-        rows = cursor.fetchall()
+        with span("snowflake_query"):
+            cursor.execute(query, (title,))
+            rows = cursor.fetchall()
         cursor.close()
         conn.close()
         logging.info(f"Fetched {len(rows)} research notes for title: {title}")
@@ -181,7 +444,7 @@ def get_research_notes(title: str) -> List[str]:
         raise
 
 # Search within Research Notes
-@app.get("/search_research_notes/{title}")
+@app.get("/search_research_notes/{title:path}")
 async def search_research_notes(title: str, query: str):
     try:
         research_notes = get_research_notes(title)
@@ -194,99 +457,309 @@ async def search_research_notes(title: str, query: str):
         logging.error(f"Error searching research notes: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while searching research notes.")
 
+# Upper bound on retrieved chunks per query; larger values only add retrieval cost
+MAX_TOP_K = 20
+
+# Retrieve, compress and generate an answer, timing each stage on its own.
+# Same steps as llama_index's query engine, spelled out so each one gets a span.
+def run_rag_query(question: str, top_k: int):
+    from llama_index.core import Settings
+    from llama_index.core.response_synthesizers import get_response_synthesizer
+    from llama_index.core.schema import QueryBundle
+    from backend.context_assembly import ContextCompressor
+
+    with span("embed_question"):
+        query_bundle = QueryBundle(query_str=question, embedding=Settings.embed_model.get_query_embedding(question))
+
+    with span("vector_query"):
+        nodes = llama_index.as_retriever(similarity_top_k=top_k).retrieve(query_bundle)
+
+    compressor = None
+    if os.getenv("CONTEXT_COMPRESSION_ENABLED", "true").lower() != "false":
+        compressor = ContextCompressor(token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200")))
+        with span("context_compression"):
+            nodes = compressor.postprocess_nodes(nodes, query_bundle)
+
+    with span("llm_generation"):
+        response = get_response_synthesizer(streaming=False).synthesize(query_bundle, nodes)
+    return response, compressor
+
+# Estimate the prompt and completion size of a query, for latency and cost tracking
+def token_usage(response, question: str, answer: str, compressor) -> dict:
+    from backend.context_assembly import count_tokens, prompt_tokens
+
+    usage = {
+        "prompt_tokens": prompt_tokens(response.source_nodes, question),
+        "completion_tokens": count_tokens(answer),
+    }
+    if compressor is not None:
+        usage.update(compressor.report)
+    record_token_usage(usage["prompt_tokens"], usage["completion_tokens"])
+    logging.info(f"request_id={request_id_var.get()} token usage: {usage}")
+    return usage
+
 # Search Full Text of the Document
-@app.get("/search_full_text/{title}")
-async def search_full_text(title: str, query: str):
+def run_full_text_search(title: str, query: str, top_k: int):
+    response, compressor = run_rag_query(query, top_k)
+    results = response.response if hasattr(response, 'response') else str(response)
+    return {"title": title, "results": results, "usage": token_usage(response, query, results, compressor)}
+
+@app.get("/search_full_text/{title:path}")
+async def search_full_text(title: str, query: str, top_k: int = Query(5, ge=1, le=MAX_TOP_K)):
     try:
-        if llama_index is None:
-            logging.error("llama_index is not initialized.")
-            raise HTTPException(status_code=500, detail="Service not initialized.")
+        if not index_ready.is_set():
+            raise not_ready_error()
 
-        query_engine = llama_index.as_query_engine(similarity_top_k=5, streaming=False)
-        response = query_engine.query(query)
-        return {"title": title, "results": response.response if hasattr(response, 'response') else str(response)}
+        key = (title.strip(), normalize_question(query), top_k)
+        return await search_flight.do(
+            key,
+            lambda: cached(answer_cache, f"search:{json.dumps(key)}", lambda: llm_admission.run(
+                lambda: run_full_text_search(title, query, top_k), priority=INTERACTIVE
+            )),
+        )
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logging.error(f"Error in full-text search: {e}")
         raise HTTPException(status_code=500, detail="An error occurred during full-text search.")
 
+# In-flight request coalescing counters
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    return {"ask": ask_flight.stats(), "search_full_text": search_flight.stats()}
+
+# LLM admission queue counters
+@app.get("/stats/admission")
+async def admission_stats():
+    return llm_admission.stats()
+
+# Embedding cache hit/miss counters
+@app.get("/stats/embedding_cache")
+async def embedding_cache_stats():
+    if cached_embed_model is None:
+        return {"enabled": False}
+    return {"enabled": True, **cached_embed_model.stats()}
+
+# Answer and metadata cache counters for this worker
+@app.get("/stats/shared_cache")
+async def shared_cache_stats():
+    return {
+        "backend": "redis" if os.getenv("SHARED_CACHE_URL") else "local",
+        "answers": answer_cache.stats(),
+        "metadata": metadata_cache.stats(),
+    }
+
+# Columns the Airflow DAG adds to existing tables (ensure_metadata_columns), by (table, columns):
+# whether they were there and when that was last checked
+column_probes = {}
+SCHEMA_PROBE_TTL_SECONDS = float(os.getenv("SCHEMA_PROBE_TTL_SECONDS", "300"))
+
+# Until the DAG has run the columns are missing, so callers fall back to the old schema;
+# a miss is probed again after a while so the columns are picked up without a restart
+def has_columns(cursor, table: str, columns: str) -> bool:
+    present, checked_at = column_probes.get((table, columns), (False, None))
+    now = time.monotonic()
+    if not present and (checked_at is None or now - checked_at >= SCHEMA_PROBE_TTL_SECONDS):
+        try:
+            cursor.execute(f"SELECT {columns} FROM {table} LIMIT 0;")
+            cursor.fetchall()
+            present = True
+        except Exception:
+            logging.warning(f"{table} has no {columns} column(s) yet.")
+        column_probes[(table, columns)] = (present, now)
+    return present
+
+# Without the thumbnail columns, select NULLs so the UI falls back to the full-size images
+def thumbnail_columns(cursor) -> str:
+    if has_columns(cursor, "PUBLICATIONS_METADATA", "THUMBNAIL_SMALL_URL, THUMBNAIL_LARGE_URL"):
+        return "THUMBNAIL_SMALL_URL, THUMBNAIL_LARGE_URL"
+    return "NULL, NULL"
+
+# Notes in the order they were saved; notes saved before CREATED_AT existed come first
+def notes_order(cursor) -> str:
+    if has_columns(cursor, "RESEARCH_NOTES", "CREATED_AT"):
+        return "CREATED_AT NULLS FIRST, NOTE_TEXT"
+    return "NOTE_TEXT"
+
 # Get List of Documents
 @app.get("/documents")
-async def get_documents():
+def get_documents():
     try:
+        documents = metadata_cache.get("documents")
+        if documents is not None:
+            return documents
         conn = init_snowflake()
         cursor = conn.cursor()
-        cursor.execute("SELECT TITLE, PDF_URL FROM PUBLICATIONS_METADATA;")
-        rows = cursor.fetchall()
-        documents = [{"title": row[0], "pdf_url": row[1]} for row in rows]
+        with span("snowflake_query"):
+            cursor.execute(f"SELECT TITLE, PDF_URL, IMAGE_URL, {thumbnail_columns(cursor)} FROM PUBLICATIONS_METADATA;")
+            rows = cursor.fetchall()
+        documents = [
+            {"title": row[0], "pdf_url": row[1], "image_url": row[2], "thumbnail_url": row[3]}
+            for row in rows
+        ]
         cursor.close()
         conn.close()
+        metadata_cache.set("documents", documents)
         logging.info(f"Retrieved {len(documents)} documents.")
         return documents
     except Exception as e:
         logging.error(f"Error retrieving documents: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while retrieving documents.")
 
-# Generate Summary for a Document
-@app.get("/documents/{title}/summary")
-async def generate_summary(title: str):
-    try:
+# Publication metadata for a title, from the metadata cache or Snowflake. A cursor
+# can be passed in to reuse the caller's connection on a miss.
+def publication_metadata(title: str, cursor=None) -> dict:
+    metadata = metadata_cache.get(f"publication:{title}")
+    if metadata is not None:
+        return metadata
+
+    conn = None
+    if cursor is None:
         conn = init_snowflake()
         cursor = conn.cursor()
-        cursor.execute("SELECT SUMMARY, IMAGE_URL, PDF_URL FROM PUBLICATIONS_METADATA WHERE TITLE = %s;", (title,))
+    with span("metadata_lookup"):
+        cursor.execute(
+            f"SELECT SUMMARY, IMAGE_URL, PDF_URL, {thumbnail_columns(cursor)} FROM PUBLICATIONS_METADATA WHERE TITLE = %s;",
+            (title,),
+        )
         row = cursor.fetchone()
-        
-        if row:
-            summary = row[0] if row[0] else "No summary available for this document."
-            image_url = row[1]
-            pdf_url = row[2]
-        else:
-            summary = "No summary available for this document."
-            image_url = None
-            pdf_url = None
-        
+    if conn is not None:
         cursor.close()
         conn.close()
-        
-        return {"summary": summary, "image_url": image_url, "pdf_url": pdf_url}
+
+    columns = ("summary", "image_url", "pdf_url", "thumbnail_small_url", "thumbnail_large_url")
+    metadata = dict(zip(columns, row)) if row else {}
+    metadata_cache.set(f"publication:{title}", metadata)
+    return metadata
+
+# Generate Summary for a Document
+@app.get("/documents/{title:path}/summary")
+def generate_summary(title: str):
+    try:
+        metadata = publication_metadata(title)
+        summary = metadata.get("summary") or "No summary available for this document."
+        return {"summary": summary, "image_url": metadata.get("image_url"), "pdf_url": metadata.get("pdf_url")}
     except Exception as e:
         logging.error(f"Error generating summary: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while generating summary.")
 
+# Largest page of notes /documents/{title}/page returns
+MAX_NOTES_LIMIT = 100
+
+# Everything the document view shows for a title, in one round trip. A plain def, so
+# FastAPI runs the blocking Snowflake calls in its threadpool instead of the event loop.
+@app.get("/documents/{title:path}/page")
+def get_document_page(title: str, notes_limit: int = Query(20, ge=1, le=MAX_NOTES_LIMIT), notes_offset: int = Query(0, ge=0)):
+    try:
+        conn = init_snowflake()
+        cursor = conn.cursor()
+        # Notes change whenever an answer is saved, so only the metadata is cached
+        metadata = publication_metadata(title, cursor)
+        with span("snowflake_query"):
+            # Fetch one extra note to tell whether more exist; the ordering keeps pages stable
+            cursor.execute(
+                f"SELECT NOTE_TEXT FROM RESEARCH_NOTES WHERE TITLE = %s ORDER BY {notes_order(cursor)} LIMIT %s OFFSET %s;",
+                (title, notes_limit + 1, notes_offset),
+            )
+            note_rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        return {
+            "title": title,
+            "summary": metadata.get("summary") or "No summary available for this document.",
+            "image_url": metadata.get("image_url"),
+            "pdf_url": metadata.get("pdf_url"),
+            "thumbnail_url": metadata.get("thumbnail_large_url"),
+            "notes": [note_row[0] for note_row in note_rows[:notes_limit]],
+            "notes_offset": notes_offset,
+            "has_more_notes": len(note_rows) > notes_limit,
+        }
+    except Exception as e:
+        logging.error(f"Error retrieving document page: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while retrieving the document.")
+
 # Ask a Question
 class AskQuestionRequest(BaseModel):
     title: str
     question: str
+    top_k: int = Field(5, ge=1, le=MAX_TOP_K)
+
+def answer_question(title: str, question: str, top_k: int):
+    response, compressor = run_rag_query(question, top_k)
+
+    if response is None:
+        raise HTTPException(status_code=500, detail="No response from the query engine.")
+
+    metadata = publication_metadata(title)
+    image_url = metadata.get("image_url")
+    pdf_url = metadata.get("pdf_url")
+
+    answer = response.response if hasattr(response, 'response') else str(response)
+    formatted_answer = f"**Research Note**: {answer}\n\n"
+    usage = token_usage(response, question, answer, compressor)
+    
+    return {"answer": formatted_answer, "image_url": image_url, "pdf_url": pdf_url, "usage": usage}
 
 @app.post("/ask")
 async def ask_question(request: AskQuestionRequest):
     try:
-        if llama_index is None:
-            logging.error("llama_index is not initialized.")
-            raise HTTPException(status_code=500, detail="Service not initialized.")
+        if not index_ready.is_set():
+            raise not_ready_error()
         
-        title = request.title
-        question = request.question
-        query_engine = llama_index.as_query_engine(similarity_top_k=5, streaming=False)
-        response = query_engine.query(question)
+        # Run the blocking query in a worker thread so concurrent duplicates can join it
+        key = (request.title.strip(), normalize_question(request.question), request.top_k)
+        return await ask_flight.do(
+            key,
+            lambda: cached(answer_cache, f"ask:{json.dumps(key)}", lambda: llm_admission.run(
+                lambda: answer_question(request.title, request.question, request.top_k), priority=INTERACTIVE
+            )),
+        )
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.error(f"Error processing question: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An error occurred while processing the question.")
 
-        if response is None:
-            raise HTTPException(status_code=500, detail="No response from the query engine.")
+# Incrementally index PDFs from S3
+class IndexPdfsRequest(BaseModel):
+    s3_keys: List[str]
 
-        conn = init_snowflake()
-        cursor = conn.cursor()
-        cursor.execute("SELECT IMAGE_URL, PDF_URL FROM PUBLICATIONS_METADATA WHERE TITLE = %s;", (title,))
-        row = cursor.fetchone()
-        image_url = row[0] if row else None
-        pdf_url = row[1] if row else None
-        cursor.close()
-        conn.close()
+def index_pdf_documents(s3_keys: List[str]) -> List[str]:
+    from llama_index.core.node_parser import SentenceSplitter
+    from backend.document_processors import get_pdf_documents
 
-        answer = response.response if hasattr(response, 'response') else str(response)
-        formatted_answer = f"**Research Note**: {answer}\n\n"
-        
-        return {"answer": formatted_answer, "image_url": image_url, "pdf_url": pdf_url}
+    with span("load_pdfs"):
+        documents = get_pdf_documents(s3_keys)
+    # PDFs are chunked more coarsely than research notes, matching insert_vector.py
+    with span("chunk"):
+        nodes = SentenceSplitter(chunk_size=1500).get_nodes_from_documents(documents)
+    with span("embed_and_insert"):
+        add_to_index(nodes)
+    logging.info(f"Indexed {len(nodes)} chunks from {len(documents)} PDFs.")
+    return [document.doc_id for document in documents]
+
+@app.post("/index_pdfs")
+async def index_pdfs(request: IndexPdfsRequest):
+    try:
+        if not index_ready.is_set():
+            raise not_ready_error()
+        # Ingestion yields to interactive questions and may take much longer
+        indexed = await llm_admission.run(
+            lambda: index_pdf_documents(request.s3_keys),
+            priority=BACKGROUND,
+            deadline=float(os.getenv("INDEX_DEADLINE_SECONDS", "1800")),
+        )
+        failed = [key for key in request.s3_keys if key not in indexed]
+        return {"indexed": indexed, "failed": failed}
+    except Overloaded as e:
+        raise overloaded_error(e)
     except HTTPException as he:
         raise he
     except Exception as e:
-        logging.error(f"Error processing question: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An error occurred while processing the question.")
\ No newline at end of file
+        logging.error(f"Error indexing PDFs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An error occurred while indexing PDFs.")
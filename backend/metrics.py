@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Tuple
+
+# Set per request by the HTTP middleware and read by every span
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+endpoint_var: ContextVar[str] = ContextVar("endpoint", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, **extra: str) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _decode_key(key) -> LabelKey:
+    return tuple(tuple(pair) for pair in key)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def multiprocess_dir():
+    """Directory where each worker publishes its metrics, from METRICS_MULTIPROC_DIR."""
+    return os.getenv("METRICS_MULTIPROC_DIR") or None
+
+
+def _quantiles(values: List[float]) -> List[float]:
+    # Nearest-rank quantiles, good enough over a few thousand samples
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES]
+
+
+class _HistogramSeries:
+    def __init__(self, buckets, reservoir_size):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir_size)
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Histograms expose cumulative buckets for Prometheus itself, plus a
+    ``<name>_recent`` summary with p50/p95/p99 over the most recent
+    observations so the numbers are readable without a Prometheus server.
+
+    With several worker processes, set ``METRICS_MULTIPROC_DIR``: each worker
+    then writes a snapshot of its metrics there (see ``write_snapshots``) and
+    ``render`` merges them, summing counters and histograms across workers and
+    labelling gauges with their worker's pid. Counters and histogram totals
+    of workers that exited are kept; their gauges and recent observations are
+    dropped. Forked workers call ``reset`` so that what the parent recorded
+    before the fork is not counted once per worker.
+    """
+
+    def __init__(self, reservoir_size: int = 2048):
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _HistogramSeries]] = {}
+        self._buckets: Dict[str, tuple] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], Dict[LabelKey, float]]] = {}
+
+    def counter(self, name: str, help_text: str):
+        self._help[name] = help_text
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self._help[name] = help_text
+        self._buckets[name] = buckets
+        self._histograms.setdefault(name, {})
+
+    def gauge_callback(self, name: str, help_text: str, fn: Callable[[], Dict[str, float]], label: str = "name"):
+        """Register a gauge whose values are read from ``fn`` at scrape time, one series per key."""
+        self._help[name] = help_text
+        self._gauge_callbacks[name] = lambda: {((label, key),): value for key, value in fn().items()}
+
+    def reset(self):
+        """Drop every recorded value, keeping the registered metrics."""
+        with self._lock:
+            for series in self._counters.values():
+                series.clear()
+            for series in self._histograms.values():
+                series.clear()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = _label_key(labels)
+        buckets = self._buckets[name]
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = _HistogramSeries(buckets, self.reservoir_size)
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                series.bucket_counts[index] += 1
+            series.count += 1
+            series.sum += value
+            series.recent.append(value)
+
+    def quantiles(self, name: str, **labels: str) -> Dict[float, float]:
+        with self._lock:
+            series = self._histograms[name].get(_label_key(labels))
+            recent = list(series.recent) if series else []
+        if not recent:
+            return {}
+        return dict(zip(QUANTILES, _quantiles(recent)))
+
+    def summary(self, name: str) -> List[dict]:
+        """Count, mean and recent quantiles of every series of a histogram."""
+        with self._lock:
+            series = [(dict(key), data.count, data.sum, list(data.recent)) for key, data in self._histograms[name].items()]
+        return [
+            {
+                **labels,
+                "count": count,
+                "mean": total / count if count else 0.0,
+                **({f"p{int(q * 100)}": value for q, value in zip(QUANTILES, _quantiles(recent))} if recent else {}),
+            }
+            for labels, count, total, recent in series
+        ]
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            counters = {name: [[key, value] for key, value in series.items()] for name, series in self._counters.items()}
+            histograms = {
+                name: [[key, data.bucket_counts, data.count, data.sum, list(data.recent)] for key, data in series.items()]
+                for name, series in self._histograms.items()
+            }
+            callbacks = list(self._gauge_callbacks.items())
+        gauges = {name: [[key, value] for key, value in fn().items()] for name, fn in callbacks}
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def write_snapshot(self):
+        directory = multiprocess_dir()
+        if directory is None:
+            return
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def write_snapshots(self, stop: threading.Event, interval: float = 5.0):
+        """Publish this worker's metrics every ``interval`` seconds until ``stop`` is set."""
+        while not stop.wait(interval):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logging.error(f"Failed to write the metrics snapshot: {e}")
+        self.write_snapshot()
+
+    def _snapshots(self) -> List[Tuple[int, dict]]:
+        # This worker's live metrics, plus the last snapshot of every other worker
+        snapshots = [(os.getpid(), self._snapshot())]
+        directory = multiprocess_dir()
+        if directory is None:
+            return snapshots
+        for filename in os.listdir(directory):
+            pid, extension = os.path.splitext(filename)
+            if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshots.append((int(pid), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        snapshots = self._snapshots()
+        per_worker = multiprocess_dir() is not None
+        counters: Dict[str, Dict[LabelKey, float]] = {name: {} for name in self._counters}
+        histograms: Dict[str, Dict[LabelKey, list]] = {name: {} for name in self._histograms}
+        gauges: Dict[str, Dict[LabelKey, float]] = {name: {} for name in self._gauge_callbacks}
+        for pid, snapshot in snapshots:
+            alive = not per_worker or pid == os.getpid() or _pid_alive(pid)
+            for name, series in snapshot["counters"].items():
+                for key, value in series:
+                    if name in counters:
+                        key = _decode_key(key)
+                        counters[name][key] = counters[name].get(key, 0.0) + value
+            for name, series in snapshot["histograms"].items():
+                for key, bucket_counts, count, total, recent in series:
+                    if name not in histograms:
+                        continue
+                    merged = histograms[name].setdefault(_decode_key(key), [[0] * len(bucket_counts), 0, 0.0, []])
+                    merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+                    merged[1] += count
+                    merged[2] += total
+                    if alive:
+                        merged[3] += recent
+            if not alive:
+                continue
+            for name, series in snapshot["gauges"].items():
+                for key, value in series:
+                    if name in gauges:
+                        key = _decode_key(key) + ((("worker", str(pid)),) if per_worker else ())
+                        gauges[name][key] = value
+
+        lines = []
+        for name, series in counters.items():
+            lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(key)} {value}" for key, value in series.items()]
+
+        for name, series in histograms.items():
+            buckets = self._buckets[name]
+            lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} histogram"]
+            for key, (bucket_counts, count, total, _) in series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, le=repr(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, le='+Inf')} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+            lines += [f"# HELP {name}_recent {self._help[name]} (recent observations)", f"# TYPE {name}_recent summary"]
+            for key, (_, _, _, recent) in series.items():
+                if recent:
+                    for q, value in zip(QUANTILES, _quantiles(recent)):
+                        lines.append(f"{name}_recent{_format_labels(key, quantile=str(q))} {value}")
+                lines.append(f"{name}_recent_sum{_format_labels(key)} {sum(recent)}")
+                lines.append(f"{name}_recent_count{_format_labels(key)} {len(recent)}")
+
+        for name, series in gauges.items():
+            lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{_format_labels(key)} {value}" for key, value in series.items()]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.histogram("http_request_duration_seconds", "Time to serve an HTTP request.")
+registry.histogram("rag_stage_duration_seconds", "Time spent in one stage of an endpoint.")
+registry.counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM.")
+registry.counter("llm_completion_tokens_total", "Completion tokens received from the LLM.")
+registry.histogram("llm_prompt_tokens", "Prompt size of each LLM call in tokens.", buckets=(128, 256, 512, 1024, 2048, 4096, 8192))
+
+
+@contextmanager
+def span(stage: str):
+    """Time one stage of the current request and log it as a JSON line."""
+    endpoint = endpoint_var.get()
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe("rag_stage_duration_seconds", duration, endpoint=endpoint, stage=stage)
+        logging.info(json.dumps({
+            "request_id": request_id_var.get(),
+            "endpoint": endpoint,
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 2),
+            "status": status,
+        }))
+
+
+def record_token_usage(prompt_tokens: int, completion_tokens: int):
+    endpoint = endpoint_var.get()
+    registry.inc("llm_prompt_tokens_total", prompt_tokens, endpoint=endpoint)
+    registry.inc("llm_completion_tokens_total", completion_tokens, endpoint=endpoint)
+    registry.observe("llm_prompt_tokens", prompt_tokens, endpoint=endpoint)
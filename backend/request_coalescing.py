@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Share one in-flight computation between concurrent calls with the same key.
+
+    The first caller for a key starts the computation as its own task; callers
+    arriving while it runs await the same task and receive its result or
+    exception. Once it finishes the key is forgotten, so results are never
+    cached beyond the lifetime of the call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.executions = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+        task = self._calls.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._forget(key))
+        self._waiters[key] += 1
+        # Shield the shared task so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable):
+        self._calls.pop(key, None)
+        self._waiters.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.requests - self.executions,
+            "fan_out_ratio": self.requests / self.executions if self.executions else 0.0,
+            "in_flight": len(self._calls),
+            "in_flight_waiters": sum(self._waiters.values()),
+        }
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.split()).casefold()
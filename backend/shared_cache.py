@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+
+class LocalCache:
+    """In-process TTL cache with LRU eviction, the default when no shared store is configured.
+
+    Each worker process keeps its own copy, so entries are not shared between
+    workers; values are returned as stored and must not be mutated.
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """Cache shared by every worker and replica through Redis, with values stored as JSON.
+
+    A Redis error is logged and treated as a miss, so an unavailable cache
+    slows requests down instead of failing them.
+    """
+
+    def __init__(self, namespace: str, ttl: float, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("SHARED_CACHE_URL needs the redis package: poetry install --with redis") from e
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Shared cache read failed for {self.namespace}: {e}")
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any):
+        try:
+            self._client.set(self._key(key), json.dumps(value), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Shared cache write failed for {self.namespace}: {e}")
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Shared cache delete failed for {self.namespace}: {e}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+# Select the cache backend from SHARED_CACHE_URL: unset for in-process, redis://... for Redis
+def create_cache(namespace: str, ttl: float):
+    url = os.getenv("SHARED_CACHE_URL")
+    if url:
+        logging.info(f"Using Redis for the {namespace} cache.")
+        return RedisCache(namespace, ttl, url)
+    return LocalCache(namespace, ttl, max_entries=int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1024")))
+
+
+async def cached(cache, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached value for ``key``, or await ``compute`` and cache its result."""
+    # Redis calls block, so they run in the threadpool like the other I/O
+    value = await run_in_threadpool(cache.get, key)
+    if value is None:
+        value = await compute()
+        await run_in_threadpool(cache.set, key, value)
+    return value
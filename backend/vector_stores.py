@@ -0,0 +1,437 @@
+import os
+import json
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+DEFAULT_LOCAL_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_store")
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    """In-process IVF vector store over a memory-mapped embedding matrix.
+
+    Embeddings are L2-normalised and kept in ``embeddings.f32``; nodes are
+    appended to ``nodes.jsonl`` and deletions recorded in ``deleted.json``, so
+    every change is persisted without rewriting the whole store. Once the store
+    holds ``min_train_size`` vectors a k-means coarse quantiser is trained and
+    queries only score the ``nprobe`` closest lists. Smaller stores, and queries
+    whose metadata filters leave few candidates, are searched exactly.
+
+    With ``read_only`` the matrix is mapped read-only and every write raises,
+    so several worker processes can share one store through the page cache.
+    A process that writes to a shared store opens it writable while holding
+    ``file_lock(exclusive=True)``; read-only stores load under the shared lock
+    and report ``is_stale()`` once a writer has changed the files.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_dir: str
+    nprobe: int = 8
+    min_train_size: int = 2048
+    exact_search_limit: int = 4096
+    read_only: bool = False
+
+    _lock: Any = PrivateAttr()
+    _vectors: Any = PrivateAttr(default=None)
+    _dimension: Optional[int] = PrivateAttr(default=None)
+    _count: int = PrivateAttr(default=0)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _metadata: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _alive: Any = PrivateAttr(default=None)
+    _row_by_id: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _rows_by_doc: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    _rows_by_title: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    _centroids: Any = PrivateAttr(default=None)
+    _assignments: Any = PrivateAttr(default=None)
+    _lists: Optional[List[Any]] = PrivateAttr(default=None)
+    _trained_count: int = PrivateAttr(default=0)
+    _loaded_version: tuple = PrivateAttr(default=())
+
+    def __init__(self, persist_dir: str = DEFAULT_LOCAL_STORE_DIR, **kwargs: Any):
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        self._lock = threading.RLock()
+        os.makedirs(persist_dir, exist_ok=True)
+        if self.read_only:
+            # A writer in another process may be halfway through a change
+            with self.file_lock():
+                self._loaded_version = self.version()
+                self._load()
+        else:
+            self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def count(self) -> int:
+        # Not __len__: an empty store would be falsy and StorageContext.from_defaults
+        # would silently replace it with a SimpleVectorStore
+        return int(self._alive[: self._count].sum()) if self._alive is not None else 0
+
+    @contextmanager
+    def file_lock(self, exclusive: bool = False):
+        with open(self._path("store.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def version(self) -> tuple:
+        # Every write replaces one of these files
+        names = ("store.json", "deleted.json", "ivf.npz")
+        return tuple(
+            os.stat(self._path(name)).st_mtime_ns if os.path.exists(self._path(name)) else 0 for name in names
+        )
+
+    def is_stale(self) -> bool:
+        return self.read_only and self.version() != self._loaded_version
+
+    # Storage layout
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_dir, name)
+
+    def _load(self):
+        meta_path = self._path("store.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self._open_vectors(meta["dimension"], meta["capacity"])
+
+        with open(self._path("nodes.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._metadata.append(record["metadata"])
+        # Rows appended after the last flush of the embedding matrix are dropped
+        self._count = min(len(self._ids), meta["count"])
+        if len(self._ids) > self._count:
+            del self._ids[self._count:]
+            del self._metadata[self._count:]
+            if not self.read_only:
+                with open(self._path("nodes.jsonl"), "w") as f:
+                    f.writelines(
+                        json.dumps({"id": node_id, "metadata": metadata}) + "\n"
+                        for node_id, metadata in zip(self._ids, self._metadata)
+                    )
+
+        self._alive = np.ones(self._vectors.shape[0], dtype=bool)
+        if os.path.exists(self._path("deleted.json")):
+            with open(self._path("deleted.json")) as f:
+                deleted = [row for row in json.load(f) if row < self._count]
+            self._alive[deleted] = False
+        for row in range(self._count):
+            if self._alive[row]:
+                self._index_row(row)
+
+        if os.path.exists(self._path("ivf.npz")):
+            ivf = np.load(self._path("ivf.npz"))
+            self._centroids = ivf["centroids"]
+            self._trained_count = int(ivf["trained_count"])
+            self._assignments = np.full(self._vectors.shape[0], -1, dtype=np.int32)
+            trained = min(len(ivf["assignments"]), self._count)
+            self._assignments[:trained] = ivf["assignments"][:trained]
+            if trained < self._count:
+                self._assign(np.arange(trained, self._count))
+        logging.info(f"Loaded {self.count()} vectors from local vector store at {self.persist_dir}.")
+
+    def _open_vectors(self, dimension: int, capacity: int):
+        path = self._path("embeddings.f32")
+        if self.read_only:
+            self._dimension = dimension
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(capacity, dimension))
+            return
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < capacity * dimension * 4:
+                f.truncate(capacity * dimension * 4)
+        self._dimension = dimension
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dimension))
+
+    def _ensure_capacity(self, dimension: int, needed: int):
+        if self._vectors is None:
+            self._open_vectors(dimension, max(1024, needed))
+            self._alive = np.zeros(self._vectors.shape[0], dtype=bool)
+            return
+        if dimension != self._dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match store dimension {self._dimension}.")
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        self._vectors = None
+        self._open_vectors(dimension, capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        if self._assignments is not None:
+            self._assignments = np.concatenate(
+                [self._assignments, np.full(capacity - len(self._assignments), -1, dtype=np.int32)]
+            )
+
+    def _write_meta(self):
+        self._vectors.flush()
+        meta = {"dimension": self._dimension, "capacity": self._vectors.shape[0], "count": self._count}
+        tmp_path = self._path("store.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path("store.json"))
+
+    def _write_deleted(self):
+        deleted = np.flatnonzero(~self._alive[: self._count]).tolist()
+        tmp_path = self._path("deleted.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(deleted, f)
+        os.replace(tmp_path, self._path("deleted.json"))
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        # Changes are written as they happen; this only flushes the matrix
+        with self._lock:
+            if self._vectors is not None and not self.read_only:
+                self._write_meta()
+
+    # Bookkeeping
+
+    def _index_row(self, row: int):
+        metadata = self._metadata[row]
+        self._row_by_id[self._ids[row]] = row
+        ref_doc_id = metadata.get("ref_doc_id")
+        if ref_doc_id is not None:
+            self._rows_by_doc.setdefault(ref_doc_id, []).append(row)
+        title = metadata.get("title")
+        if isinstance(title, str):
+            self._rows_by_title.setdefault(title, []).append(row)
+
+    def _unindex_row(self, row: int):
+        self._alive[row] = False
+        self._lists = None
+        metadata = self._metadata[row]
+        if self._row_by_id.get(self._ids[row]) == row:
+            del self._row_by_id[self._ids[row]]
+        for lookup, value in ((self._rows_by_doc, metadata.get("ref_doc_id")), (self._rows_by_title, metadata.get("title"))):
+            rows = lookup.get(value)
+            if rows and row in rows:
+                rows.remove(row)
+                if not rows:
+                    del lookup[value]
+
+    # Write path
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"The local vector store at {self.persist_dir} is open read-only.")
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        self._check_writable()
+        if not nodes:
+            return []
+        embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._ensure_capacity(embeddings.shape[1], self._count + len(nodes))
+            start = self._count
+            replaced = False
+            lines = []
+            for offset, node in enumerate(nodes):
+                row = start + offset
+                # Adding a node id that already exists replaces the old row
+                if node.node_id in self._row_by_id:
+                    self._unindex_row(self._row_by_id[node.node_id])
+                    replaced = True
+                metadata = node_to_metadata_dict(node, remove_text=False, flat_metadata=self.flat_metadata)
+                self._ids.append(node.node_id)
+                self._metadata.append(metadata)
+                self._alive[row] = True
+                self._index_row(row)
+                lines.append(json.dumps({"id": node.node_id, "metadata": metadata}))
+
+            self._vectors[start:start + len(nodes)] = embeddings
+            with open(self._path("nodes.jsonl"), "a") as f:
+                f.write("\n".join(lines) + "\n")
+            self._count += len(nodes)
+            self._write_meta()
+            if replaced:
+                self._write_deleted()
+
+            if self._centroids is not None:
+                self._assign(np.arange(start, self._count))
+            if self.count() >= self.min_train_size and self.count() >= 2 * self._trained_count:
+                self._train()
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._check_writable()
+        with self._lock:
+            rows = list(self._rows_by_doc.get(ref_doc_id, []))
+            for row in rows:
+                self._unindex_row(row)
+            if rows:
+                self._write_deleted()
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None, **delete_kwargs: Any) -> None:
+        self._check_writable()
+        with self._lock:
+            rows = self._candidate_rows(node_ids=node_ids, filters=filters)
+            if rows is None:
+                return
+            for row in rows.tolist():
+                self._unindex_row(row)
+            if len(rows):
+                self._write_deleted()
+
+    def clear(self) -> None:
+        self._check_writable()
+        with self._lock:
+            for row in np.flatnonzero(self._alive[: self._count]).tolist() if self._alive is not None else []:
+                self._unindex_row(row)
+            if self._alive is not None:
+                self._write_deleted()
+
+    # IVF index
+
+    def _train(self, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+        rows = np.flatnonzero(self._alive[: self._count])
+        nlist = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(seed)
+        sample = self._vectors[rng.choice(rows, size=min(sample_size, len(rows)), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+
+        self._centroids = centroids
+        self._assignments = np.full(self._vectors.shape[0], -1, dtype=np.int32)
+        self._assign(np.arange(self._count))
+        self._trained_count = len(rows)
+        np.savez(
+            self._path("ivf.npz"),
+            centroids=centroids,
+            assignments=self._assignments[: self._count],
+            trained_count=self._trained_count,
+        )
+        logging.info(f"Trained IVF index with {nlist} lists over {len(rows)} vectors.")
+
+    def _assign(self, rows: np.ndarray, batch_size: int = 8192):
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            self._assignments[batch] = np.argmax(self._vectors[batch] @ self._centroids.T, axis=1)
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            rows = np.flatnonzero(self._alive[: self._count])
+            order = np.argsort(self._assignments[rows], kind="stable")
+            boundaries = np.searchsorted(self._assignments[rows][order], np.arange(len(self._centroids) + 1))
+            self._lists = [rows[order][boundaries[c]:boundaries[c + 1]] for c in range(len(self._centroids))]
+        return self._lists
+
+    # Read path
+
+    def _candidate_rows(self, node_ids=None, doc_ids=None, filters=None) -> Optional[np.ndarray]:
+        """Return the rows allowed by id and metadata filters, or None if unrestricted."""
+        candidates = None
+        if node_ids:
+            candidates = {self._row_by_id[i] for i in node_ids if i in self._row_by_id}
+        if doc_ids:
+            rows = {row for doc_id in doc_ids for row in self._rows_by_doc.get(doc_id, [])}
+            candidates = rows if candidates is None else candidates & rows
+        if filters is not None and filters.filters:
+            title_filter = (
+                len(filters.filters) == 1
+                and not isinstance(filters.filters[0], MetadataFilters)
+                and filters.filters[0].key == "title"
+                and filters.filters[0].operator == FilterOperator.EQ
+            )
+            if title_filter:
+                rows = set(self._rows_by_title.get(filters.filters[0].value, []))
+            else:
+                pool = candidates if candidates is not None else np.flatnonzero(self._alive[: self._count]).tolist()
+                filter_fn = _build_metadata_filter_fn(lambda row: self._metadata[row], filters)
+                rows = {row for row in pool if filter_fn(row)}
+            candidates = rows if candidates is None else candidates & rows
+        if candidates is None:
+            return None
+        return np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        with self._lock:
+            if self._vectors is None or query.query_embedding is None:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            q = np.asarray(query.query_embedding, dtype=np.float32)
+            q /= np.linalg.norm(q) or 1
+
+            candidates = self._candidate_rows(query.node_ids, query.doc_ids, query.filters)
+            if candidates is None and self._centroids is not None and self.count() > self.exact_search_limit:
+                probes = np.argsort(-(self._centroids @ q))[: self.nprobe]
+                lists = self._inverted_lists()
+                candidates = np.concatenate([lists[c] for c in probes])
+            elif candidates is None:
+                candidates = np.flatnonzero(self._alive[: self._count])
+            if len(candidates) == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+            scores = self._vectors[candidates] @ q
+            k = min(query.similarity_top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            rows = candidates[top].tolist()
+            nodes = [metadata_dict_to_node(self._metadata[row]) for row in rows]
+            return VectorStoreQueryResult(
+                nodes=nodes,
+                similarities=scores[top].tolist(),
+                ids=[self._ids[row] for row in rows],
+            )
+
+
+# Select the vector store backend from VECTOR_STORE_BACKEND ("pinecone" or "local")
+# read_only overrides LOCAL_VECTOR_STORE_READ_ONLY for the local store
+def create_vector_store(read_only: Optional[bool] = None):
+    backend = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+    if backend == "local":
+        if read_only is None:
+            read_only = os.getenv("LOCAL_VECTOR_STORE_READ_ONLY", "false").lower() == "true"
+        vector_store = LocalVectorStore(
+            persist_dir=os.getenv("LOCAL_VECTOR_STORE_DIR", DEFAULT_LOCAL_STORE_DIR),
+            nprobe=int(os.getenv("LOCAL_VECTOR_STORE_NPROBE", "8")),
+            read_only=read_only,
+        )
+        logging.info("LocalVectorStore initialized successfully.")
+        return vector_store
+    if backend == "pinecone":
+        from llama_index.vector_stores.pinecone import PineconeVectorStore
+
+        vector_store = PineconeVectorStore(
+            index_name=os.getenv("PINECONE_INDEX_NAME"),
+            dimension=768  # Ensure this matches the embedding dimension
+        )
+        logging.info("PineconeVectorStore initialized successfully.")
+        return vector_store
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
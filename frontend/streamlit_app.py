@@ -1,28 +1,42 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
+from urllib.parse import quote
 
 # Load environment variables
 load_dotenv()
 
 API_BASE_URL = "http://backend:8000"  # Set this to match your FastAPI server URL
 
-# Define all publications with their titles and image URLs
-image_publications = [
-    {"title": "An Introduction to Alternative Credit", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/an-introduction-to-alt-credit_v2.jpg"},
-    {"title": "Beyond Active and Passive Investing: The Customization of Finance", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/cover-beyond-active-and-passive.jpg"},
-    {"title": "2023 International Guide to Cost of Capital", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Cover-from-2023-International-Guide-to-Cost-of-Capital_CFA-Kroll-Final.jpg"},
-    {"title": "Bookstaber RF 2022", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Cover-from-Bookstaber_RF_2022_Online.png"},
-    {"title": "Investment Luminaries and Their Insights", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Cover-from-Investment-Luminaries-and-Their-Insights-25-Years-of-the-Research-Foundation-Vertin-Award.png"},
-    {"title": "ME Markets RF Brief 2022", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Cover-from-ME_Markets_RF_Brief_2022_Online.png"},
-    {"title": "Revisiting the Equity Risk Premium", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Cover-from-Revisiting-the-Equity-Risk-Premium_Online.jpg"},
-    {"title": "Investment Horizon", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/cover-investment-horizon.jpg"},
-    {"title": "Investment Model Validation", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/cover-investment-model-validation.jpg"},
-    {"title": "Private Equity", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/cover-private-equity.jpg"},
-    {"title": "Handbook of AI and Big Data Applications in Investments", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Handbook-of-AI-and-Big-Data-Applications-in-Investments_Front-Cover.jpg"},
-    {"title": "Horan RF Brief 2022", "image_url": "https://cfa-publications-bucket.s3.us-east-2.amazonaws.com/images/Horan_RF_Brief_2022_Cover.png"},
-]
+# One pooled keep-alive session per Streamlit server, shared across reruns
+@st.cache_resource
+def get_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Cached backend reads; failures raise so they are not cached
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_documents():
+    response = get_http_session().get(f"{API_BASE_URL}/documents", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_document_page(title, notes_offset=0):
+    response = get_http_session().get(
+        f"{API_BASE_URL}/documents/{quote(title, safe='')}/page", params={"notes_offset": notes_offset}, timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+# Show one more page of research notes for a title on the next rerun
+def show_more_notes(title):
+    st.session_state.notes_pages[title] = st.session_state.notes_pages.get(title, 1) + 1
 
 def main():
     # Set the page layout to wide
@@ -36,15 +50,16 @@ def main():
         st.session_state.modified_answer = ""
     if 'research_notes' not in st.session_state:
         st.session_state.research_notes = []
+    if 'notes_pages' not in st.session_state:
+        st.session_state.notes_pages = {}
 
     # Fetch document list
     st.subheader("Explore Documents")
-    response = requests.get(f"{API_BASE_URL}/documents")
-    if response.status_code == 200:
-        documents = response.json()
+    try:
+        documents = fetch_documents()
         # All publication titles for dropdown
         doc_titles = [doc["title"] for doc in documents]
-    else:
+    except requests.RequestException:
         st.error("Failed to retrieve documents")
         return
 
@@ -52,7 +67,14 @@ def main():
     st.sidebar.header(" Publications Grid View")
     st.sidebar.write("Click on an image to select a publication:")
 
-    # Display the images in pairs side by side for publications with images only
+    # Display the covers of publications that have one in pairs side by side,
+    # preferring the compact thumbnail over the full-size image
+    covers = {}
+    for doc in documents:
+        cover_url = doc.get("thumbnail_url") or doc.get("image_url")
+        if cover_url and doc["title"] not in covers:  # Button keys must be unique per title
+            covers[doc["title"]] = cover_url
+    image_publications = [{"title": title, "image_url": url} for title, url in covers.items()]
     cols = st.sidebar.columns(2)  # Create two columns for side by side display
     for i, pub in enumerate(image_publications):
         col_index = i % 2  # Determine which column to use
@@ -72,12 +94,14 @@ def main():
         index=doc_titles.index(st.session_state.selected_title) if st.session_state.selected_title in doc_titles else 0
     )
 
-    # Fetch document summary for the selected title
-    summary_response = requests.get(f"{API_BASE_URL}/documents/{selected_title_dropdown}/summary")
-    if summary_response.status_code == 200:
-        data = summary_response.json()
+    # Fetch summary, links and research notes for the selected title in one call
+    try:
+        data = fetch_document_page(selected_title_dropdown)
+    except requests.RequestException:
+        data = None
+    if data is not None:
         summary = data.get('summary', "No summary available.")
-        image_url = data.get('image_url')
+        image_url = data.get('thumbnail_url') or data.get('image_url')
         pdf_url = data.get('pdf_url')
 
         # Display document summary
@@ -94,26 +118,36 @@ def main():
         if pdf_url:
             st.markdown(f"[ Download PDF]({pdf_url})", unsafe_allow_html=True)
 
-        # Fetch and display existing research notes
+        # Display existing research notes
         st.markdown("<h4> Existing Research Notes</h4>", unsafe_allow_html=True)
-        notes_response = requests.get(f"{API_BASE_URL}/view_research_notes/{selected_title_dropdown}")
-        if notes_response.status_code == 200:
-            notes_data = notes_response.json()
-            st.session_state.research_notes = notes_data.get("notes", [])
-            if st.session_state.research_notes:
-                for note in st.session_state.research_notes:
-                    st.write(f"- {note}")
-            else:
-                st.write("No research notes available.")
+        notes = list(data.get("notes", []))
+        has_more_notes = data.get("has_more_notes", False)
+        # Further pages the user asked for; each page is cached like the first one
+        for _ in range(st.session_state.notes_pages.get(selected_title_dropdown, 1) - 1):
+            if not has_more_notes:
+                break
+            try:
+                page = fetch_document_page(selected_title_dropdown, len(notes))
+            except requests.RequestException:
+                st.error("Failed to retrieve more research notes")
+                break
+            notes.extend(page.get("notes", []))
+            has_more_notes = page.get("has_more_notes", False)
+        st.session_state.research_notes = notes
+        if st.session_state.research_notes:
+            for note in st.session_state.research_notes:
+                st.write(f"- {note}")
+            if has_more_notes:
+                st.button("Show more research notes", on_click=show_more_notes, args=(selected_title_dropdown,))
         else:
-            st.error("Failed to retrieve research notes")
+            st.write("No research notes available.")
 
         # Ask a question and get an answer
         st.markdown("<h4> Ask a Question</h4>", unsafe_allow_html=True)
         user_question = st.text_input("Enter your question about this document:")
         if st.button("Get Answer"):
             if user_question.strip():
-                answer_response = requests.post(f"{API_BASE_URL}/ask", json={
+                answer_response = get_http_session().post(f"{API_BASE_URL}/ask", json={
                     "question": user_question,
                     "title": selected_title_dropdown
                 })
@@ -133,16 +167,15 @@ def main():
         # Save the modified answer
         if st.button("Save Modified Answer"):
             if st.session_state.modified_answer.strip():
-                save_response = requests.post(f"{API_BASE_URL}/save_modified_answer", json={
+                save_response = get_http_session().post(f"{API_BASE_URL}/save_modified_answer", json={
                     "title": selected_title_dropdown,
                     "modified_answer": st.session_state.modified_answer
                 })
                 if save_response.status_code == 200:
                     st.success("Modified answer saved successfully")
-                    notes_response = requests.get(f"{API_BASE_URL}/view_research_notes/{selected_title_dropdown}")
-                    if notes_response.status_code == 200:
-                        notes_data = notes_response.json()
-                        st.session_state.research_notes = notes_data.get("notes", [])
+                    # The save response already lists the notes; drop the stale cached page
+                    st.session_state.research_notes = save_response.json().get("research_notes", [])
+                    fetch_document_page.clear()
                 else:
                     st.error("Failed to save modified answer")
             else:
@@ -153,8 +186,8 @@ def main():
         search_query = st.text_input("Enter a search term for research notes:")
         if st.button("Search Notes"):
             if search_query.strip():
-                search_response = requests.get(
-                    f"{API_BASE_URL}/search_research_notes/{selected_title_dropdown}",
+                search_response = get_http_session().get(
+                    f"{API_BASE_URL}/search_research_notes/{quote(selected_title_dropdown, safe='')}",
                     params={"query": search_query.strip()}
                 )
                 if search_response.status_code == 200:
@@ -173,8 +206,8 @@ def main():
         full_text_query = st.text_input("Enter a search term for the full text of the document:")
         if st.button("Search Full Text"):
             if full_text_query.strip():
-                full_text_response = requests.get(
-                    f"{API_BASE_URL}/search_full_text/{selected_title_dropdown}",
+                full_text_response = get_http_session().get(
+                    f"{API_BASE_URL}/search_full_text/{quote(selected_title_dropdown, safe='')}",
                     params={"query": full_text_query.strip()}
                 )
                 if full_text_response.status_code == 200: